@@ -0,0 +1,117 @@
+import asyncio
+import sys
+from datetime import datetime
+from dotenv import load_dotenv
+from telethon import errors
+from tgstats.database import Database, dispose_engines
+from tgstats.client import get_backfill_client
+from tgstats.collectors import CollectionContext, PostCommentsCollector
+from tgstats.collectors.runner import get_channel_peer
+from tgstats.collectors.channel_posts import save_posts, save_reactions
+from tgstats.telegram.history import MessageRecord
+from tgstats.config.config import CHANNEL_IDS, CHANNEL_USERNAME, BACKFILL_CHUNK_SIZE
+from tgstats.logger import get_logger
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Создаем логгер
+logger = get_logger(__name__)
+
+# Имя курсора загрузки истории в таблице collector_cursors
+BACKFILL_CURSOR_NAME = 'backfill'
+
+class HistoryBackfill:
+    """
+    Загрузка всей истории канала через takeout-сессию.
+
+    История читается от новых сообщений к старым пачками по chunk_size сообщений.
+    После сохранения пачки (посты, реакции, комментарии) в курсор записывается
+    самый старый обработанный ID, поэтому прерванная загрузка продолжается с того же
+    места. Когда история закончилась, в курсоре сохраняется время завершения.
+    """
+
+    def __init__(self, client, db, channel, chunk_size=BACKFILL_CHUNK_SIZE):
+        self.client = client
+        self.db = db
+        self.channel = channel
+        self.chunk_size = chunk_size
+        self.context = CollectionContext(client, db.fork(), channel)
+
+    async def run(self):
+        chat = await self.context.get_entity()
+        cursor = self.db.get_cursor(chat.id, BACKFILL_CURSOR_NAME)
+        if cursor.last_date is not None:
+            logger.info(f"История канала {chat.id} уже загружена ({cursor.last_date})")
+            return
+
+        offset_id = cursor.last_id or 0
+        total = 0
+        while True:
+            records = [
+                MessageRecord.from_message(message, keep_raw=True)
+                async for message in self.client.iter_messages(chat, offset_id=offset_id, limit=self.chunk_size)
+                if message.date
+            ]
+            if not records:
+                break
+
+            self._save_posts(chat, records)
+            # Комментарии новых постов: коллектор продолжает с курсоров постов
+            await PostCommentsCollector(self.client, self.db, self.context, mode='per_post').run(self.channel)
+
+            offset_id = min(record.id for record in records)
+            total += len(records)
+            cursor = self.db.get_cursor(chat.id, BACKFILL_CURSOR_NAME)
+            cursor.last_id = offset_id
+            self.db.commit()
+            logger.info(f"Загружено {total} сообщений канала {chat.id}, контрольная точка: ID {offset_id}")
+
+        cursor = self.db.get_cursor(chat.id, BACKFILL_CURSOR_NAME)
+        cursor.last_date = datetime.utcnow()
+        self.db.commit()
+        logger.info(f"Загрузка истории канала {chat.id} завершена: {total} сообщений")
+
+    def _save_posts(self, chat, records):
+        """Сохраняет пачку постов и их реакций одной транзакцией"""
+        post_ids = save_posts(self.db, chat.id, records)
+        save_reactions(self.db, post_ids, records)
+        self.db.commit()
+
+    def close(self):
+        self.context.db.close()
+
+async def main(channels=None):
+    logger.info("Запуск загрузки истории каналов")
+    db = Database()
+
+    # Отдельная сессия: загрузка идет независимо от сбора статистики по расписанию
+    client = get_backfill_client(db)
+    await client.start()
+
+    try:
+        channels = channels or (CHANNEL_IDS if CHANNEL_IDS else [CHANNEL_USERNAME])
+        async with client.takeout(finalize=True, channels=True, megagroups=True) as takeout:
+            for channel in channels:
+                backfill = HistoryBackfill(takeout, db, get_channel_peer(channel))
+                try:
+                    await backfill.run()
+                except Exception as e:
+                    logger.error(f"Ошибка при загрузке истории канала {channel}: {str(e)}", exc_info=True)
+                finally:
+                    backfill.close()
+
+    except errors.TakeoutInitDelayError as e:
+        logger.error(f"Takeout-сессию нужно подтвердить в Telegram, повторите запуск через {e.seconds} с")
+    finally:
+        logger.info(f"Статистика запросов к Telegram: {client.rate_limiter.stats()}")
+        await client.disconnect()
+        db.close()
+        logger.info("Загрузка истории завершена")
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(sys.argv[1:]))
+    finally:
+        # Пулы соединений закрываются только при завершении процесса
+        dispose_engines()
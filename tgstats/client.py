@@ -1,11 +1,22 @@
 import os
 import shutil
+from telethon.sessions import StringSession
 from tgstats.telegram.client import TelegramClient
-from tgstats.config.config import API_ID, API_HASH, SESSION_PATH
+from tgstats.telegram.entity_cache import EntityCache
+from tgstats.telegram.pool import ClientPool
+from tgstats.telegram.rate_limiter import RateLimiter
+from tgstats.config.config import API_ID, API_HASH, SESSION_PATH, SESSIONS, BACKFILL_SESSION, FLOOD_MAX_RETRIES, FLOOD_MAX_WAIT
 from tgstats.logger import get_logger
 
 logger = get_logger('client')
 
+# Бюджеты запросов takeout-сессии: лимиты на выгрузку истории у нее мягче
+BACKFILL_BUDGETS = {
+    'GetHistoryRequest': (5.0, 20),
+    'GetRepliesRequest': (5.0, 20),
+    'GetMessagesRequest': (5.0, 20),
+}
+
 def get_session_file():
     """
     Проверяет наличие локального файла сессии и при необходимости копирует его из SESSION_PATH
@@ -34,10 +45,51 @@ def get_session_file():
     logger.info(f"Файл сессии не найден, будет создан новый: {local_session}")
     return local_session
 
-def get_client():
+def get_client(db=None):
     """
-    Возвращает клиент Telegram
+    Возвращает клиент Telegram.
+    Если передана база данных, разрешенные сущности кэшируются в ней между запусками
     """
     session_file = get_session_file()
     logger.info(f"Создание клиента Telegram с сессией: {session_file}")
-    return TelegramClient(session_file, API_ID, API_HASH)
+    entity_cache = EntityCache(db.fork() if db is not None else None)
+    return TelegramClient(session_file, API_ID, API_HASH, entity_cache=entity_cache)
+
+def get_session(value):
+    """Сессия из списка TG_SESSIONS: путь к файлу .session или строка StringSession"""
+    if value.endswith('.session') or os.path.exists(value):
+        return value
+    return StringSession(value)
+
+def get_client_pool(db=None):
+    """
+    Возвращает пул клиентов Telegram по сессиям из TG_SESSIONS
+    (без списка - пул из одного клиента с сессией get_session_file)
+    """
+    if not SESSIONS:
+        return ClientPool([get_client(db)])
+    
+    clients = []
+    for number, value in enumerate(SESSIONS, 1):
+        logger.info(f"Создание клиента Telegram для аккаунта {number}")
+        entity_cache = EntityCache(db.fork() if db is not None else None)
+        clients.append(TelegramClient(get_session(value), API_ID, API_HASH, entity_cache=entity_cache))
+    return ClientPool(clients)
+
+def get_backfill_client(db=None):
+    """
+    Возвращает клиент для загрузки истории. Он работает в отдельной сессии
+    (при первом запуске - копии основной) и с собственным ограничителем запросов,
+    поэтому не мешает сбору статистики по расписанию
+    """
+    session = BACKFILL_SESSION
+    if session.endswith('.session') and not os.path.exists(session):
+        source = get_session_file()
+        if os.path.exists(source):
+            logger.info(f"Копируем файл сессии из {source} в {session}")
+            shutil.copy2(source, session)
+    
+    logger.info("Создание клиента Telegram для загрузки истории")
+    rate_limiter = RateLimiter(budgets=BACKFILL_BUDGETS, max_retries=FLOOD_MAX_RETRIES, max_wait=FLOOD_MAX_WAIT)
+    entity_cache = EntityCache(db.fork() if db is not None else None)
+    return TelegramClient(get_session(session), API_ID, API_HASH, rate_limiter=rate_limiter, entity_cache=entity_cache)
@@ -1,8 +1,8 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from tgstats.database import Database
-from tgstats.client import get_client
+from tgstats.database import Database, dispose_engines
+from tgstats.client import get_client_pool
 from tgstats.collectors import PostCommentsCollector
 from tgstats.config.config import CHANNEL_IDS, CHANNEL_USERNAME
 from tgstats.logger import get_logger
@@ -37,25 +37,31 @@ async def collect_comments(client, db, channel):
 async def main():
     logger.info("Запуск сбора комментариев")
     
-    # Инициализируем клиент Telegram
-    logger.info("Инициализация клиента Telegram")
-    client = get_client()
-    await client.start()
-    
     # Инициализируем базу данных
     logger.info("Инициализация базы данных")
     db = Database()
     
+    # Инициализируем клиенты Telegram (кэш сущностей хранится в базе данных)
+    logger.info("Инициализация клиентов Telegram")
+    pool = get_client_pool(db)
+    await pool.start()
+    
     try:
-        # Собираем комментарии для каждого канала
+        # Собираем комментарии для каждого канала через аккаунт, отведенный под комментарии
         channels = CHANNEL_IDS if CHANNEL_IDS else [CHANNEL_USERNAME]
-        for channel in channels:
-            await collect_comments(client, db, channel)
+        for shard, channel in enumerate(channels):
+            await collect_comments(pool.get(PostCommentsCollector.role, shard), db, channel)
             
     finally:
-        logger.info("Отключение клиента Telegram")
-        await client.disconnect()
+        pool.log_stats()
+        logger.info("Отключение клиентов Telegram")
+        await pool.disconnect()
+        db.close()
         logger.info("Сбор комментариев завершен")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        # Пулы соединений закрываются только при завершении процесса
+        dispose_engines() 
\ No newline at end of file
@@ -1,15 +1,19 @@
+from .context import CollectionContext
 from .channel_stats import ChannelStatsCollector
 from .channel_posts import ChannelPostsCollector
 from .channel_participants import ChannelParticipantsCollector
 from .channel_activity import ChannelActivityCollector
 from .discussion_stats import DiscussionStatsCollector
 from .post_comments import PostCommentsCollector
+from .broadcast_stats import BroadcastStatsCollector
 
 __all__ = [
+    'CollectionContext',
     'ChannelStatsCollector',
     'ChannelPostsCollector',
     'ChannelParticipantsCollector',
     'ChannelActivityCollector',
     'DiscussionStatsCollector',
-    'PostCommentsCollector'
+    'PostCommentsCollector',
+    'BroadcastStatsCollector'
 ]
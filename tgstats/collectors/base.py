@@ -1,9 +1,22 @@
 from abc import ABC, abstractmethod
+from .context import CollectionContext
 
 class BaseCollector(ABC):
-    def __init__(self, client, db):
+    # Коллекторы, результаты которых должны быть сохранены до запуска этого коллектора
+    depends_on = ()
+    # Роль коллектора в пуле клиентов: определяет аккаунт, через который идут его запросы
+    role = 'history'
+
+    def __init__(self, client, db, context=None):
         self.client = client
         self.db = db
+        self.context = context
+
+    def get_context(self, channel):
+        """Возвращает общий контекст прогона или создает собственный, если коллектор запущен отдельно"""
+        if self.context is None:
+            self.context = CollectionContext(self.client, self.db, channel)
+        return self.context
 
     @abstractmethod
     async def run(self, channel):
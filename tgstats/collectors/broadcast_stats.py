@@ -0,0 +1,66 @@
+from datetime import datetime
+from .base import BaseCollector
+from .membership_log import can_read_admin_log
+from tgstats.database.models import ChannelStatsPoint
+from tgstats.database.upsert import bulk_upsert
+from tgstats.telegram.stats import get_broadcast_stats, iter_graph_points, iter_summary_points, get_point_date
+from tgstats.logger import get_logger
+
+logger = get_logger('collectors.broadcast_stats')
+
+# Имя графика для сводных показателей периода
+SUMMARY_GRAPH = 'summary'
+
+class BroadcastStatsCollector(BaseCollector):
+    """
+    Статистика канала из stats.getBroadcastStats: рост, подписчики, просмотры по часам,
+    взаимодействия и другие графики Telegram. Доступна только администраторам каналов
+    с включенной статистикой; точки графиков сохраняются в channel_stats_points.
+    """
+
+    async def run(self, channel):
+        logger.info(f"Начало сбора статистики Telegram для канала: {channel}")
+
+        context = self.get_context(channel)
+        chat = await context.get_entity(self.client)
+        full_chat = await context.get_full_channel()
+
+        if not can_read_admin_log(chat) or not getattr(full_chat.full_chat, 'can_view_stats', False):
+            logger.info(f"Статистика Telegram недоступна для канала {chat.id}")
+            return
+
+        stats, graphs = await get_broadcast_stats(self.client, chat)
+
+        points = {}
+        for name, graph in graphs.items():
+            for series, x, value in iter_graph_points(graph):
+                points[(name, series, x)] = value
+
+        # Сводные показатели относятся к концу периода статистики
+        period_end = stats.period.max_date.replace(tzinfo=None)
+        period_x = int(stats.period.max_date.timestamp() * 1000)
+        for series, value in iter_summary_points(stats):
+            points[(SUMMARY_GRAPH, series, period_x)] = value
+
+        # Точки пишутся одним INSERT ... ON CONFLICT без чтения сохраненной истории графиков
+        current_time = datetime.utcnow()
+        rows = [
+            {
+                'channel_id': chat.id,
+                'graph': graph,
+                'series': series,
+                'x': x,
+                'date': period_end if graph == SUMMARY_GRAPH else get_point_date(x),
+                'value': value,
+                'updated_at': current_time
+            }
+            for (graph, series, x), value in points.items()
+        ]
+        bulk_upsert(
+            self.db, ChannelStatsPoint, rows,
+            index_elements=('channel_id', 'graph', 'series', 'x'),
+            update_columns=('value', 'updated_at')
+        )
+
+        self.db.commit()
+        logger.info(f"Статистика Telegram сохранена: {len(graphs)} графиков, {len(points)} точек")
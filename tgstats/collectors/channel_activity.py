@@ -1,22 +1,50 @@
 from datetime import datetime, timedelta
-from telethon.tl.functions.messages import GetHistoryRequest
 from .base import BaseCollector
 from tgstats.database.models import HourlyActivity
+from tgstats.database.upsert import bulk_upsert
 from tgstats.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Счетчики почасовой активности
+HOURLY_COUNTERS = ('views', 'forwards', 'reactions', 'posts_count')
+
+def get_hourly_rows(channel_id, date, active_hours):
+    """Строки hourly_activity канала за дату из счетчиков {час: {счетчик: значение}}"""
+    return [
+        {
+            'channel_id': channel_id,
+            'date': date,
+            'hour': hour,
+            **{counter: stats[counter] for counter in HOURLY_COUNTERS}
+        }
+        for hour, stats in active_hours.items()
+    ]
+
+def save_hourly_activity(db, rows):
+    """
+    Сохраняет почасовую активность (одного или нескольких каналов) одним
+    многострочным INSERT ... ON CONFLICT (channel_id, date, hour) DO UPDATE
+    """
+    current_time = datetime.utcnow()
+    bulk_upsert(
+        db, HourlyActivity,
+        [{**row, 'updated_at': current_time} for row in rows],
+        index_elements=('channel_id', 'date', 'hour')
+    )
+
 class ChannelActivityCollector(BaseCollector):
     """Сборщик статистики активности канала"""
     
-    def __init__(self, client, db):
-        super().__init__(client, db)
+    def __init__(self, client, db, context=None):
+        super().__init__(client, db, context)
         self.today = datetime.now().date()
         self.yesterday = self.today - timedelta(days=1)
     
     async def run(self, channel):
         """Сбор статистики активности канала"""
-        self.channel = await self.client.get_entity(channel)
+        context = self.get_context(channel)
+        self.channel = await context.get_entity()
         logger.info(f"Начинаю сбор статистики активности для канала {self.channel.title}")
         
         # Инициализация счетчиков
@@ -27,13 +55,8 @@ class ChannelActivityCollector(BaseCollector):
             'posts_count': 0
         } for hour in range(24)}
         
-        # Получаем все сообщения за последние 24 часа
-        messages = await self.client.get_messages(
-            self.channel,
-            limit=None,
-            offset_date=None,
-            reverse=True
-        )
+        # Берем сообщения из общего окна прогона (оно покрывает последние сутки)
+        messages = await context.get_messages()
         
         for message in messages:
             message_date = message.date.date()
@@ -48,44 +71,12 @@ class ChannelActivityCollector(BaseCollector):
             # Обновляем статистику
             active_hours[hour]['views'] += message.views or 0
             active_hours[hour]['forwards'] += message.forwards or 0
-            
-            # Проверяем наличие реакций
-            if hasattr(message, 'reactions') and message.reactions:
-                active_hours[hour]['reactions'] += sum(
-                    reaction.count for reaction in message.reactions.results
-                )
+            active_hours[hour]['reactions'] += message.reactions_count
             
             active_hours[hour]['posts_count'] += 1
         
-        # Сохраняем статистику в базу данных
-        for hour, stats in active_hours.items():
-            # Проверяем существующую запись
-            existing = self.db.query(HourlyActivity).filter(
-                HourlyActivity.channel_id == self.channel.id,
-                HourlyActivity.date == self.today,
-                HourlyActivity.hour == hour
-            ).first()
-            
-            if existing:
-                # Обновляем существующую запись
-                existing.views = stats['views']
-                existing.forwards = stats['forwards']
-                existing.reactions = stats['reactions']
-                existing.posts_count = stats['posts_count']
-                existing.updated_at = datetime.utcnow()
-            else:
-                # Создаем новую запись
-                activity = HourlyActivity(
-                    channel_id=self.channel.id,
-                    date=self.today,
-                    hour=hour,
-                    views=stats['views'],
-                    forwards=stats['forwards'],
-                    reactions=stats['reactions'],
-                    posts_count=stats['posts_count']
-                )
-                self.db.add(activity)
-        
+        # Сохраняем все 24 часа одним оператором
+        save_hourly_activity(self.db, get_hourly_rows(self.channel.id, self.today, active_hours))
         self.db.commit()
         logger.info(f"Статистика активности для канала {self.channel.title} успешно сохранена")
         
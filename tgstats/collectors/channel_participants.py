@@ -1,156 +1,78 @@
-from telethon.tl.functions.channels import GetParticipantsRequest
-from telethon.tl.types import ChannelParticipantsSearch
-from datetime import datetime, timedelta
+import json
+import random
+from datetime import datetime
+from telethon.errors import UserNotParticipantError
+from telethon.tl.functions.channels import GetParticipantRequest
+from telethon.tl.types import InputPeerUser
 from .base import BaseCollector
+from .participants_crawler import ParticipantsCrawler
+from .membership_log import AdminLogMembershipTracker, can_read_admin_log, ADMIN_LOG_CURSOR_NAME, ADMIN_LOG_RETENTION
 from tgstats.database.models import ChannelParticipant
+from tgstats.database.upsert import copy_rows
 from tgstats.utils import convert_to_json_serializable
-from sqlalchemy import and_
+from sqlalchemy import and_, text
+from tgstats.config.config import CHURN_MIN_COVERAGE, CHURN_PROBE_SAMPLE
 from tgstats.logger import get_logger
 from sqlalchemy.exc import SQLAlchemyError
 
 logger = get_logger('collectors.channel_participants')
 
+TABLE = ChannelParticipant.__tablename__
+# Временная таблица для загрузки участников через COPY
+STAGING_TABLE = 'staging_channel_participants'
+STAGING_COLUMNS = ('user_id', 'username', 'first_name', 'last_name', 'phone', 'is_bot', 'raw')
+
 class ChannelParticipantsCollector(BaseCollector):
+    role = 'participants'
+    
     async def run(self, channel):
         logger.info(f"Начало сбора участников канала: {channel}")
         
         try:
             # Получаем информацию о канале
-            chat = await self.client.get_entity(channel)
-            
-            # Список букв, цифр и символов для поиска
-            search_letters = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm', 
-                            'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z',
-                            'а', 'б', 'в', 'г', 'д', 'е', 'ё', 'ж', 'з', 'и', 'й', 'к', 'л', 'м',
-                            'н', 'о', 'п', 'р', 'с', 'т', 'у', 'ф', 'х', 'ц', 'ч', 'ш', 'щ', 'ъ',
-                            'ы', 'ь', 'э', 'ю', 'я',
-                            '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
-                            '_', '.', '-']
+            context = self.get_context(channel)
+            chat = await context.get_entity(self.client)
+            full_chat = await context.get_full_channel()
+            participants_count = full_chat.full_chat.participants_count
             
-            all_participants = []
             current_time = datetime.utcnow()
             
-            # Поиск участников по каждой букве
-            for letter in search_letters:
-                offset = 0
-                limit = 200
-                
-                while True:
-                    try:
-                        participants = await self.client(GetParticipantsRequest(
-                            channel=chat,
-                            filter=ChannelParticipantsSearch(letter),
-                            offset=offset,
-                            limit=limit,
-                            hash=0
-                        ))
-                        
-                        if not participants.users:
-                            break
-                            
-                        # Проверяем, нет ли уже этих пользователей в списке
-                        new_users = [user for user in participants.users if user.id not in [p.id for p in all_participants]]
-                        all_participants.extend(new_users)
-                        total_count = len(all_participants)
-                        logger.info(f"Получено {total_count} участников (поиск по '{letter}')")
-                        
-                        if len(participants.users) < limit:
-                            break
-                            
-                        offset += limit
-                    except Exception as e:
-                        logger.error(f"Ошибка при получении участников по букве '{letter}': {str(e)}")
-                        break
+            # В каналах, где мы администраторы, вступления и выходы берем из журнала администратора
+            admin_log_cursor = None
+            if can_read_admin_log(chat):
+                admin_log_cursor = self.db.get_cursor(chat.id, ADMIN_LOG_CURSOR_NAME)
+                if await self._sync_admin_log(chat, channel, admin_log_cursor, current_time):
+                    logger.info(f"Участники канала обновлены по журналу администратора")
+                    return
+            
+            # Обходим участников адаптивным деревом поисковых префиксов (до participants_count),
+            # пачки по мере поступления загружаются во временную таблицу
+            self._create_staging_table()
+            crawler = ParticipantsCrawler(self.client, chat, target=participants_count)
+            async for batch in crawler.crawl():
+                self._stage_batch(batch)
+            
+            logger.info(f"Всего получено {len(crawler.seen)} участников")
+            
+            # Пустой обход (список участников недоступен или поиск не удался) ничего не меняет:
+            # иначе все сохраненные участники считались бы вышедшими
+            if not crawler.seen:
+                logger.warning("Не удалось получить ни одного участника, сохранение пропущено")
+                return
             
-            logger.info(f"Всего получено {len(all_participants)} участников")
+            # Слияние с таблицей участников и отток фиксируются одной транзакцией
+            rejoined = self._merge_staged(channel, current_time)
+            await self._apply_churn(chat, channel, crawler, participants_count, current_time, rejoined)
             
-            # Сохраняем информацию о каждом участнике
-            for user in all_participants:
+            # После полного обхода следующие запуски могут продолжать по журналу администратора
+            if admin_log_cursor is not None:
                 try:
-                    # Начинаем новую транзакцию для каждого участника
-                    self.db.session.begin_nested()
-                    
-                    # Проверяем, существует ли уже такой участник
-                    existing_participant = self.db.query(ChannelParticipant).filter(
-                        and_(
-                            ChannelParticipant.channel_id == channel,
-                            ChannelParticipant.user_id == user.id
-                        )
-                    ).first()
-                    
-                    if existing_participant:
-                        # Обновляем существующего участника
-                        existing_participant.username = user.username
-                        existing_participant.first_name = user.first_name
-                        existing_participant.last_name = user.last_name
-                        existing_participant.phone = user.phone if hasattr(user, 'phone') else None
-                        existing_participant.raw = convert_to_json_serializable(user)
-                        existing_participant.updated_at = current_time
-                        # Если участник был помечен как вышедший, сбрасываем это
-                        if existing_participant.left_at:
-                            existing_participant.left_at = None
-                    else:
-                        # Добавляем нового участника
-                        participant = ChannelParticipant(
-                            channel_id=channel,
-                            user_id=user.id,
-                            username=user.username,
-                            first_name=user.first_name,
-                            last_name=user.last_name,
-                            phone=user.phone if hasattr(user, 'phone') else None,
-                            raw=convert_to_json_serializable(user)
-                        )
-                        self.db.add(participant)
-                    
-                    # Фиксируем транзакцию для текущего участника
+                    admin_log_cursor.last_id = await AdminLogMembershipTracker(self.client, chat).get_last_event_id()
+                    admin_log_cursor.last_date = current_time
                     self.db.session.commit()
-                    
                 except Exception as e:
-                    # Откатываем транзакцию в случае ошибки
                     self.db.session.rollback()
-                    logger.error(f"Ошибка при обработке участника {user.id}: {str(e)}")
-                    continue
-            
-            # Проверяем участников, которых нет в текущем списке
-            ten_minutes_ago = current_time - timedelta(minutes=10)
-            potentially_left_participants = self.db.query(ChannelParticipant).filter(
-                and_(
-                    ChannelParticipant.channel_id == channel,
-                    ChannelParticipant.updated_at < ten_minutes_ago,
-                    ChannelParticipant.left_at.is_(None)  # Проверяем только тех, кто еще не помечен как вышедший
-                )
-            ).all()
-            
-            if potentially_left_participants:
-                logger.info(f"Проверка {len(potentially_left_participants)} потенциально вышедших участников")
-                
-                # Получаем список ID всех текущих участников
-                current_participant_ids = {user.id for user in all_participants}
-                
-                # Проверяем каждого потенциально вышедшего участника
-                for participant in potentially_left_participants:
-                    if participant.user_id not in current_participant_ids:
-                        try:
-                            # Пробуем получить информацию о пользователе
-                            try:
-                                user = await self.client.get_entity(participant.user_id)
-                                # Если получилось получить информацию, проверяем его права в канале
-                                participant_info = await self.client.get_permissions(chat, user)
-                                if not participant_info.is_member:
-                                    # Если пользователь больше не участник, помечаем его как вышедшего
-                                    participant.left_at = current_time
-                                    self.db.session.commit()
-                                    logger.info(f"Участник {participant.user_id} помечен как вышедший")
-                            except Exception as e:
-                                # Если не удалось получить информацию о пользователе,
-                                # вероятно он действительно вышел из канала
-                                participant.left_at = current_time
-                                self.db.session.commit()
-                                logger.info(f"Участник {participant.user_id} помечен как вышедший (не удалось получить информацию)")
-                        except Exception as e:
-                            self.db.session.rollback()
-                            logger.error(f"Ошибка при проверке вышедшего участника {participant.user_id}: {str(e)}")
-                            continue
+                    logger.warning(f"Не удалось установить курсор журнала администратора: {str(e)}")
             
             logger.info(f"Участники канала сохранены")
             
@@ -160,4 +82,162 @@ class ChannelParticipantsCollector(BaseCollector):
             raise
         finally:
             # Закрываем сессию базы данных
-            self.db.session.close() 
\ No newline at end of file
+            self.db.session.close()
+
+    def _create_staging_table(self):
+        """
+        Создает временную таблицу для загрузки участников. Таблица живет до конца
+        транзакции, в которой выполняется слияние
+        """
+        self.db.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ("
+            "user_id BIGINT, username TEXT, first_name TEXT, last_name TEXT, "
+            "phone TEXT, is_bot BOOLEAN, raw JSON"
+            ") ON COMMIT DROP"
+        ))
+
+    def _stage_batch(self, users):
+        """Загружает пачку участников во временную таблицу командой COPY"""
+        copy_rows(self.db, STAGING_TABLE, STAGING_COLUMNS, (
+            (
+                user.id,
+                user.username,
+                user.first_name,
+                user.last_name,
+                getattr(user, 'phone', None),
+                bool(getattr(user, 'bot', False)),
+                json.dumps(convert_to_json_serializable(user))
+            )
+            for user in users
+        ))
+
+    def _merge_staged(self, channel, current_time):
+        """
+        Одним INSERT ... ON CONFLICT переносит участников из временной таблицы:
+        новые добавляются, существующие обновляются, у вернувшихся сбрасывается
+        дата выхода. Возвращает число вернувшихся участников
+        """
+        params = {'channel_id': channel, 'current_time': current_time}
+        rejoined = self.db.execute(text(
+            f"SELECT count(DISTINCT p.user_id) FROM {TABLE} p "
+            f"JOIN {STAGING_TABLE} s ON s.user_id = p.user_id "
+            "WHERE p.channel_id = :channel_id AND p.left_at IS NOT NULL"
+        ), params).scalar()
+        
+        columns = ', '.join(STAGING_COLUMNS)
+        updates = ', '.join(f"{column} = EXCLUDED.{column}" for column in STAGING_COLUMNS if column != 'user_id')
+        self.db.execute(text(
+            f"INSERT INTO {TABLE} (channel_id, {columns}, date, updated_at, left_at) "
+            f"SELECT DISTINCT ON (user_id) :channel_id, {columns}, :current_time, :current_time, NULL "
+            f"FROM {STAGING_TABLE} ORDER BY user_id "
+            "ON CONFLICT (channel_id, user_id) DO UPDATE SET "
+            f"{updates}, updated_at = EXCLUDED.updated_at, left_at = NULL"
+        ), params)
+        self.db.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+        return rejoined
+
+    async def _apply_churn(self, chat, channel, crawler, participants_count, current_time, rejoined=0):
+        """
+        Вычисляет отток как разность множеств: активные участники из базы минус обойденные ID.
+        Вышедшие участники отмечаются одним UPDATE (вернувшихся уже обработало слияние)
+        """
+        active_ids = {
+            user_id for user_id, in self.db.query(ChannelParticipant.user_id).filter(
+                and_(
+                    ChannelParticipant.channel_id == channel,
+                    ChannelParticipant.left_at.is_(None)
+                )
+            ).all()
+        }
+        left_ids = active_ids - crawler.seen
+        
+        # По неполному обходу нельзя судить об оттоке: непойманные поиском участники выглядели бы вышедшими
+        if participants_count and len(crawler.seen) < participants_count * CHURN_MIN_COVERAGE:
+            logger.warning(
+                f"Обход покрыл {len(crawler.seen)} из {participants_count} участников, "
+                f"отметка вышедших участников пропущена"
+            )
+            left_ids = set()
+        elif left_ids and CHURN_PROBE_SAMPLE:
+            left_ids = await self._probe_left(chat, channel, left_ids)
+        
+        self._set_left_at(channel, left_ids, current_time)
+        self.db.session.commit()
+        logger.info(f"Отток участников: {len(left_ids)} вышли, {rejoined} вернулись")
+
+    def _set_left_at(self, channel, user_ids, left_at):
+        """Одним UPDATE проставляет (или сбрасывает) дату выхода для набора участников"""
+        if not user_ids:
+            return
+        self.db.query(ChannelParticipant).filter(
+            and_(
+                ChannelParticipant.channel_id == channel,
+                ChannelParticipant.user_id.in_(list(user_ids))
+            )
+        ).update({ChannelParticipant.left_at: left_at}, synchronize_session=False)
+
+    async def _sync_admin_log(self, chat, channel, cursor, current_time):
+        """
+        Применяет вступления и выходы из журнала администратора после курсора.
+        Возвращает False, если нужен полный обход: курсор еще не установлен,
+        устарел дольше срока хранения журнала или журнал недоступен
+        """
+        if cursor.last_date is None or current_time - cursor.last_date > ADMIN_LOG_RETENTION:
+            logger.info("Курсор журнала администратора отсутствует или устарел, выполняется полный обход")
+            return False
+        
+        try:
+            tracker = AdminLogMembershipTracker(self.client, chat)
+            joined, left_ids, last_event_id = await tracker.fetch(cursor.last_id or 0)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать журнал администратора, выполняется полный обход: {str(e)}")
+            return False
+        
+        if joined:
+            self._create_staging_table()
+            self._stage_batch(list(joined.values()))
+            self._merge_staged(channel, current_time)
+        self._set_left_at(channel, left_ids, current_time)
+        
+        cursor.last_id = last_event_id
+        cursor.last_date = current_time
+        self.db.session.commit()
+        return True
+
+    async def _probe_left(self, chat, channel, left_ids):
+        """
+        Выборочно проверяет через API ограниченное число вышедших участников.
+        Найденные в канале участники исключаются из вышедших; если таких больше половины
+        выборки, обход считается ненадежным и отметка вышедших пропускается
+        """
+        sample = random.sample(sorted(left_ids), min(CHURN_PROBE_SAMPLE, len(left_ids)))
+        access_hashes = {
+            user_id: (raw or {}).get('access_hash')
+            for user_id, raw in self.db.query(ChannelParticipant.user_id, ChannelParticipant.raw).filter(
+                and_(
+                    ChannelParticipant.channel_id == channel,
+                    ChannelParticipant.user_id.in_(sample)
+                )
+            ).all()
+        }
+        
+        still_members = set()
+        for user_id in sample:
+            try:
+                await self.client(GetParticipantRequest(
+                    channel=chat,
+                    participant=InputPeerUser(user_id, access_hashes.get(user_id) or 0)
+                ))
+                still_members.add(user_id)
+            except UserNotParticipantError:
+                pass
+            except Exception as e:
+                logger.warning(f"Не удалось проверить участника {user_id}: {str(e)}")
+        
+        if len(still_members) * 2 > len(sample):
+            logger.warning(
+                f"{len(still_members)} из {len(sample)} проверенных участников все еще в канале, "
+                f"отметка вышедших участников пропущена"
+            )
+            return set()
+        return left_ids - still_members
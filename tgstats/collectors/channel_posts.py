@@ -1,110 +1,108 @@
-from datetime import datetime, timedelta
-from telethon.tl.functions.messages import GetHistoryRequest
+from collections import defaultdict
 from .base import BaseCollector
+from .context import POSTS_CURSOR_NAME
 from tgstats.database.models import ChannelPost, PostReaction
-from tgstats.utils import convert_to_json_serializable
-from sqlalchemy import and_
+from tgstats.database.upsert import bulk_upsert
 from tgstats.logger import get_logger
 
 logger = get_logger('collectors.channel_posts')
 
+# Колонки поста, которые обновляются по записи со счетчиками
+COUNTER_COLUMNS = ('views', 'forwards', 'replies')
+
+def save_posts(db, channel_id, records):
+    """
+    Сохраняет записи MessageRecord в channel_posts двумя операторами INSERT ... ON CONFLICT:
+    полные записи обновляют пост целиком, записи со счетчиками - только счетчики.
+    Возвращает {message_id: id поста}
+    """
+    full_rows, counter_rows = [], []
+    for record in records:
+        row = {
+            'channel_id': channel_id,
+            'message_id': record.id,
+            'date': record.date,
+            'views': record.views,
+            'forwards': record.forwards,
+            'replies': record.replies
+        }
+        if record.full:
+            row.update(text=record.text, media_type=record.media_type, raw=record.raw)
+            full_rows.append(row)
+        else:
+            counter_rows.append(row)
+    
+    post_ids = {}
+    for rows, update_columns in ((full_rows, None), (counter_rows, COUNTER_COLUMNS)):
+        returned = bulk_upsert(
+            db, ChannelPost, rows,
+            index_elements=('channel_id', 'message_id'),
+            update_columns=update_columns,
+            returning=('message_id', 'id')
+        )
+        post_ids.update(dict(returned))
+    return post_ids
+
+def save_reactions(db, post_ids, records):
+    """
+    Сравнивает реакции записей с сохраненными количествами и одним оператором
+    INSERT ... ON CONFLICT пишет только новые и изменившиеся. Реакции, которые
+    сняли все пользователи, обнуляются. Возвращает число изменившихся реакций
+    """
+    stored = defaultdict(dict)
+    if post_ids:
+        # Строки без ключа реакции остались от старых версий и не сравниваются
+        for post_id, reaction, count in db.query(
+            PostReaction.post_id, PostReaction.reaction, PostReaction.count
+        ).filter(
+            PostReaction.post_id.in_(list(post_ids.values())),
+            PostReaction.reaction.isnot(None)
+        ):
+            stored[post_id][reaction] = count
+    
+    rows = []
+    for record in records:
+        # Пропускаем реакции для постов, которых нет в базе
+        if record.id not in post_ids:
+            continue
+        post_id = post_ids[record.id]
+        current = {reaction: count for reaction, count in record.reactions if reaction is not None}
+        for reaction_type, count in current.items():
+            if stored[post_id].get(reaction_type) != count:
+                rows.append({'post_id': post_id, 'reaction': reaction_type, 'count': count, 'date': record.date})
+        for reaction_type, count in stored[post_id].items():
+            if reaction_type not in current and count:
+                rows.append({'post_id': post_id, 'reaction': reaction_type, 'count': 0, 'date': record.date})
+    
+    # Дата реакции - дата поста, она задается только при вставке
+    bulk_upsert(db, PostReaction, rows, index_elements=('post_id', 'reaction'), update_columns=('count',))
+    return len(rows)
+
 class ChannelPostsCollector(BaseCollector):
     async def run(self, channel):
         logger.info(f"Начало сбора постов канала: {channel}")
         
-        # Получаем все сообщения канала
-        chat = await self.client.get_entity(channel)
-        posts = await self.client.get_messages(chat, limit=None)
+        context = self.get_context(channel)
+        chat = await context.get_entity()
         
-        # Собираем статистику
-        now = datetime.utcnow().replace(tzinfo=None)  # Убираем информацию о часовом поясе
-        week_ago = now - timedelta(days=7)
+        # Получаем только новые сообщения и сообщения из окна обновления
+        posts = await context.get_messages()
+        week_ago = context.window_start
+        cursor = self.db.get_cursor(chat.id, POSTS_CURSOR_NAME)
         
-        # Словарь для хранения ID постов в базе данных
-        post_ids = {}
+        # Считаем только посты за последнюю неделю (дата записи уже без часового пояса)
+        posts = [message for message in posts if message.date >= week_ago]
         
-        # Обрабатываем каждый пост
-        for message in posts:
-            if not message.date:
-                continue
-                
-            # Убираем информацию о часовом поясе для сравнения
-            message_date = message.date.replace(tzinfo=None)
-            
-            # Считаем только посты за последнюю неделю
-            if message_date < week_ago:
-                continue
-                
-            # Проверяем, есть ли уже такой пост в базе
-            existing_post = self.db.query(ChannelPost).filter(
-                and_(
-                    ChannelPost.channel_id == chat.id,
-                    ChannelPost.message_id == message.id
-                )
-            ).first()
-            
-            if existing_post:
-                # Обновляем существующий пост
-                existing_post.views = message.views
-                existing_post.forwards = message.forwards
-                existing_post.text = message.text
-                existing_post.date = message_date
-                existing_post.media_type = message.media.__class__.__name__ if message.media else None
-                existing_post.replies = message.replies.replies if message.replies else 0
-                existing_post.raw = convert_to_json_serializable(message)
-                post_ids[message.id] = existing_post.id
-            else:
-                # Создаем новый пост
-                post = ChannelPost(
-                    channel_id=chat.id,
-                    message_id=message.id,
-                    views=message.views,
-                    forwards=message.forwards,
-                    text=message.text,
-                    date=message_date,
-                    media_type=message.media.__class__.__name__ if message.media else None,
-                    replies=message.replies.replies if message.replies else 0,
-                    raw=convert_to_json_serializable(message)
-                )
-                self.db.add(post)
-                self.db.flush()  # Получаем ID нового поста
-                post_ids[message.id] = post.id
+        # Посты и реакции сохраняются пачкой в несколько операторов
+        post_ids = save_posts(self.db, chat.id, posts)
+        changed = save_reactions(self.db, post_ids, posts)
+        logger.info(f"Посты канала за последнюю неделю сохранены: {len(post_ids)} постов, изменилось {changed} реакций")
         
-        self.db.commit()
-        logger.info(f"Посты канала за последнюю неделю сохранены")
-
-        # Сохраняем реакции
-        for message in posts:
-            if message.reactions and message.reactions.results:
-                # Пропускаем реакции для постов, которых нет в базе
-                if message.id not in post_ids:
-                    continue
-                    
-                for reaction_count in message.reactions.results:
-                    if reaction_count.reaction:
-                        # Получаем тип реакции
-                        reaction_data = convert_to_json_serializable(reaction_count.reaction)
-                        reaction_type = reaction_data.get('emoticon') if isinstance(reaction_data, dict) else str(reaction_data)
-                        
-                        # Проверяем, существует ли уже реакция
-                        existing_reaction = self.db.query(PostReaction).filter(
-                            and_(
-                                PostReaction.post_id == post_ids[message.id],
-                                PostReaction.reaction == reaction_type
-                            )
-                        ).first()
-                        
-                        if existing_reaction:
-                            # Обновляем количество реакций
-                            existing_reaction.count = reaction_count.count
-                        else:
-                            # Создаем новую реакцию
-                            new_reaction = PostReaction(
-                                post_id=post_ids[message.id],
-                                reaction=reaction_type,
-                                count=reaction_count.count,
-                                date=message.date.replace(tzinfo=None)  # Убираем информацию о часовом поясе
-                            )
-                            self.db.add(new_reaction)
+        # Сдвигаем курсор: самый новый ID и самая старая дата, еще входящая в окно
+        window_dates = [message.date for message in posts if message.id in post_ids]
+        if post_ids:
+            cursor.last_id = max(max(post_ids), cursor.last_id or 0)
+        cursor.last_date = min(window_dates) if window_dates else week_ago
         
-        self.db.commit() 
\ No newline at end of file
+        self.db.commit()
+        logger.info(f"Курсор постов канала обновлен: last_id={cursor.last_id}, last_date={cursor.last_date}")
@@ -1,4 +1,3 @@
-from telethon.tl.functions.channels import GetFullChannelRequest
 from datetime import datetime
 from .base import BaseCollector
 from tgstats.database.models import ChannelStats
@@ -25,11 +24,12 @@ class ChannelStatsCollector(BaseCollector):
         
         # Получаем информацию о канале
         logger.info("Получение информации о канале")
-        chat = await self.client.get_entity(channel)
+        context = self.get_context(channel)
+        chat = await context.get_entity()
         logger.info(f"Получена информация о канале: {chat.title} (ID: {chat.id})")
         
         logger.info("Получение полной информации о канале")
-        full_chat = await self.client(GetFullChannelRequest(chat))
+        full_chat = await context.get_full_channel()
         logger.info(f"Получена полная информация о канале. Подписчиков: {full_chat.full_chat.participants_count}")
 
         # Преобразуем данные для JSON
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timedelta
+from telethon.tl.functions.channels import GetFullChannelRequest
+from collections import defaultdict
+from tgstats.database.models import ChannelPost, PostReaction
+from tgstats.telegram.history import MessageRecord, iter_window, iter_views, iter_reactions
+from sqlalchemy import and_
+from tgstats.logger import get_logger
+
+logger = get_logger('collectors.context')
+
+# Окно обновления постов (в днях)
+WINDOW_DAYS = 7
+# Имя курсора постов в таблице collector_cursors
+POSTS_CURSOR_NAME = 'channel_posts'
+
+class CollectionContext:
+    """
+    Общие данные одного прогона сбора статистики по каналу.
+
+    Сущность канала, полная информация о канале и окно сообщений запрашиваются
+    у Telegram один раз и переиспользуются всеми коллекторами прогона.
+    Коллекторы могут обращаться к контексту параллельно: одновременные запросы
+    одного и того же ресурса ждут единственной загрузки. Полная информация и окно
+    сообщений запрашиваются клиентом контекста.
+    """
+
+    def __init__(self, client, db, channel, window_days=WINDOW_DAYS):
+        self.client = client
+        self.db = db
+        self.channel = channel
+        self.window_start = datetime.utcnow() - timedelta(days=window_days)
+
+        self._entity = None
+        self._client_entities = {}
+        self._full_channel = None
+        self._messages = None
+        self._entity_lock = asyncio.Lock()
+        self._full_channel_lock = asyncio.Lock()
+        self._messages_lock = asyncio.Lock()
+
+    async def get_entity(self, client=None):
+        """
+        Сущность канала. Для клиента другого аккаунта пула сущность разрешается
+        этим клиентом: access_hash у каждого аккаунта свой
+        """
+        async with self._entity_lock:
+            if self._entity is None:
+                self._entity = await self.client.get_entity(self.channel)
+            if client is None or client is self.client:
+                return self._entity
+            if client not in self._client_entities:
+                peer = self._entity.username or self.channel
+                self._client_entities[client] = await client.get_entity(peer)
+            return self._client_entities[client]
+
+    async def get_full_channel(self):
+        """Результат GetFullChannelRequest для канала"""
+        async with self._full_channel_lock:
+            if self._full_channel is None:
+                chat = await self.get_entity()
+                self._full_channel = await self.client(GetFullChannelRequest(chat))
+        return self._full_channel
+
+    async def get_messages(self):
+        """
+        Окно сообщений канала в виде компактных записей MessageRecord:
+        новые сообщения после курсора постов и записи со счетчиками (full=False)
+        для уже известных постов, еще входящих в окно обновления.
+        """
+        async with self._messages_lock:
+            if self._messages is None:
+                try:
+                    self._messages = await self._fetch_window()
+                finally:
+                    # Сессия контекста нужна только для чтения окна: возвращаем соединение в пул,
+                    # а не держим его открытым в транзакции до конца прогона канала
+                    self.db.close()
+        return self._messages
+
+    async def _fetch_window(self):
+        """
+        Новые сообщения (ID больше сохраненного в курсоре) читаются потоково с конца истории
+        до границы окна, для уже известных постов окна запрашиваются только счетчики.
+        """
+        chat = await self.get_entity()
+        last_id = self.db.get_cursor(chat.id, POSTS_CURSOR_NAME).last_id or 0
+        # Соединение не удерживается, пока история читается из Telegram
+        self.db.close()
+
+        # Новые сообщения: история от самых новых до last_id или до границы окна
+        messages = [
+            record async for record in iter_window(
+                self.client, chat, since=self.window_start, min_id=last_id, keep_raw=True
+            )
+        ]
+        logger.info(f"Получено {len(messages)} новых сообщений (после ID {last_id})")
+
+        # Известные посты, которые еще входят в окно обновления: для них обновляются
+        # только счетчики, поэтому сообщения целиком не перечитываются
+        if last_id:
+            known = self.db.query(ChannelPost.id, ChannelPost.message_id, ChannelPost.date).filter(
+                and_(
+                    ChannelPost.channel_id == chat.id,
+                    ChannelPost.message_id <= last_id,
+                    ChannelPost.date >= self.window_start
+                )
+            ).all()
+            posts = {message_id: (post_id, date) for post_id, message_id, date in known}
+            self.db.close()
+
+            refreshed = {
+                message_id: MessageRecord.from_views(message_id, posts[message_id][1], views)
+                async for message_id, views in iter_views(self.client, chat, list(posts))
+            }
+
+            # Реакции счетчиками не возвращаются - запрашиваем их отдельно пачками;
+            # для постов без обновления реакций остаются сохраненные значения
+            fresh = {
+                message_id: reactions
+                async for message_id, reactions in iter_reactions(self.client, chat, list(refreshed))
+            }
+            stored = defaultdict(list)
+            if len(fresh) < len(refreshed):
+                for post_id, reaction, count in self.db.query(
+                    PostReaction.post_id, PostReaction.reaction, PostReaction.count
+                ).filter(
+                    PostReaction.post_id.in_([posts[message_id][0] for message_id in refreshed]),
+                    PostReaction.reaction.isnot(None)
+                ):
+                    stored[post_id].append((reaction, count))
+            for message_id, record in refreshed.items():
+                record.reactions = fresh.get(message_id, stored[posts[message_id][0]])
+
+            if posts:
+                logger.info(
+                    f"Обновлены счетчики {len(refreshed)} из {len(posts)} постов в окне "
+                    f"(реакции - у {len(fresh)})"
+                )
+            messages.extend(refreshed.values())
+
+        return messages
@@ -0,0 +1,85 @@
+from collections import defaultdict
+from datetime import timezone
+from telethon.tl.types import PeerChannel
+from tgstats.logger import get_logger
+
+logger = get_logger('collectors.discussion_scan')
+
+# Имя курсора обхода группы обсуждения в таблице collector_cursors
+DISCUSSION_CURSOR_NAME = 'discussion_scan'
+# Сколько сообщений запрашивать по ID за один запрос
+IDS_BATCH_SIZE = 100
+
+def get_thread_top_id(message):
+    """ID верхнего сообщения треда, к которому относится ответ (None для сообщений вне тредов)"""
+    reply_to = getattr(message, 'reply_to', None)
+    if reply_to is None:
+        return None
+    return getattr(reply_to, 'reply_to_top_id', None) or getattr(reply_to, 'reply_to_msg_id', None)
+
+def get_forwarded_post_id(message, channel_id):
+    """ID поста канала, автоматической копией которого является сообщение группы обсуждения"""
+    fwd_from = getattr(message, 'fwd_from', None)
+    if fwd_from is None:
+        return None
+    for peer, post_id in ((fwd_from.saved_from_peer, fwd_from.saved_from_msg_id),
+                          (fwd_from.from_id, fwd_from.channel_post)):
+        if isinstance(peer, PeerChannel) and peer.channel_id == channel_id and post_id:
+            return post_id
+    return None
+
+class DiscussionScanner:
+    """
+    Однопроходный обход группы обсуждения канала.
+
+    История группы читается один раз от курсора вперед, ответы раскладываются
+    по тредам (reply_to_top_id). Верхние сообщения тредов - автоматические копии
+    постов канала; их соответствие постам берется из пересылки (fwd_from).
+    """
+
+    def __init__(self, client, chat, group):
+        self.client = client
+        self.chat = chat
+        self.group = group
+
+    async def get_start_id(self, since):
+        """ID последнего сообщения группы до момента since (UTC без часового пояса)"""
+        messages = await self.client.get_messages(
+            self.group, limit=1, offset_date=since.replace(tzinfo=timezone.utc)
+        )
+        return messages[0].id if messages else 0
+
+    async def scan(self, min_id):
+        """
+        Возвращает (ответы по тредам {top_id: [сообщения]}, посты тредов {top_id: post_id},
+        максимальный ID прочитанного сообщения)
+        """
+        threads = defaultdict(list)
+        posts = {}
+        last_id = min_id
+        scanned = 0
+        async for message in self.client.iter_messages(self.group, min_id=min_id, reverse=True):
+            scanned += 1
+            last_id = max(last_id, message.id)
+            post_id = get_forwarded_post_id(message, self.chat.id)
+            if post_id:
+                posts[message.id] = post_id
+                continue
+            top_id = get_thread_top_id(message)
+            if top_id:
+                threads[top_id].append(message)
+
+        logger.info(f"Группа обсуждения: прочитано {scanned} сообщений после ID {min_id}, {len(threads)} тредов")
+        return threads, posts, last_id
+
+    async def resolve_posts(self, top_ids):
+        """Соответствие {top_id: post_id} для верхних сообщений тредов, запрошенных по ID"""
+        posts = {}
+        top_ids = list(top_ids)
+        for i in range(0, len(top_ids), IDS_BATCH_SIZE):
+            messages = await self.client.get_messages(self.group, ids=top_ids[i:i + IDS_BATCH_SIZE])
+            for message in messages:
+                post_id = get_forwarded_post_id(message, self.chat.id) if message else None
+                if post_id:
+                    posts[message.id] = post_id
+        return posts
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from telethon.tl.functions.channels import GetAdminLogRequest
+from telethon.tl.types import (
+    ChannelAdminLogEventsFilter,
+    ChannelAdminLogEventActionParticipantJoin,
+    ChannelAdminLogEventActionParticipantJoinByInvite,
+    ChannelAdminLogEventActionParticipantJoinByRequest,
+    ChannelAdminLogEventActionParticipantInvite,
+    ChannelAdminLogEventActionParticipantLeave
+)
+from tgstats.logger import get_logger
+
+logger = get_logger('collectors.membership_log')
+
+# Имя курсора журнала администратора в таблице collector_cursors
+ADMIN_LOG_CURSOR_NAME = 'participants_admin_log'
+# Telegram хранит события журнала администратора 48 часов
+ADMIN_LOG_RETENTION = timedelta(hours=48)
+# Размер страницы GetAdminLogRequest
+PAGE_SIZE = 100
+
+JOIN_ACTIONS = (
+    ChannelAdminLogEventActionParticipantJoin,
+    ChannelAdminLogEventActionParticipantJoinByInvite,
+    ChannelAdminLogEventActionParticipantJoinByRequest
+)
+
+def can_read_admin_log(chat):
+    """Есть ли у нашей сессии права администратора в канале"""
+    return bool(getattr(chat, 'creator', False) or getattr(chat, 'admin_rights', None))
+
+class AdminLogMembershipTracker:
+    """
+    Инкрементальное отслеживание вступлений и выходов по журналу администратора канала.
+
+    Читает события join/leave/invite с ID больше курсора и сводит их к итоговому
+    состоянию каждого пользователя (учитывается последнее событие).
+    """
+
+    def __init__(self, client, chat):
+        self.client = client
+        self.chat = chat
+        self.requests = 0
+
+    async def fetch(self, min_id):
+        """
+        Возвращает (вступившие пользователи {user_id: User}, ID вышедших, максимальный ID события)
+        """
+        events = []
+        users = {}
+        max_id = 0
+        while True:
+            result = await self.client(GetAdminLogRequest(
+                channel=self.chat,
+                q='',
+                max_id=max_id,
+                min_id=min_id,
+                limit=PAGE_SIZE,
+                events_filter=ChannelAdminLogEventsFilter(join=True, leave=True, invite=True)
+            ))
+            self.requests += 1
+            events.extend(result.events)
+            users.update({user.id: user for user in result.users})
+
+            if len(result.events) < PAGE_SIZE:
+                break
+            # События приходят от новых к старым, следующая страница - старше самого старого
+            max_id = min(event.id for event in result.events)
+
+        # Итоговое состояние пользователя определяется последним событием
+        states = {}
+        for event in sorted(events, key=lambda event: event.id):
+            if isinstance(event.action, JOIN_ACTIONS):
+                states[event.user_id] = True
+            elif isinstance(event.action, ChannelAdminLogEventActionParticipantInvite):
+                states[event.action.participant.user_id] = True
+            elif isinstance(event.action, ChannelAdminLogEventActionParticipantLeave):
+                states[event.user_id] = False
+
+        joined = {user_id: users[user_id] for user_id, joined in states.items() if joined and user_id in users}
+        left_ids = {user_id for user_id, joined in states.items() if not joined}
+        last_event_id = max((event.id for event in events), default=min_id)
+
+        logger.info(
+            f"Журнал администратора: {len(events)} событий, {len(joined)} вступили, "
+            f"{len(left_ids)} вышли ({self.requests} запросов)"
+        )
+        return joined, left_ids, last_event_id
+
+    async def get_last_event_id(self):
+        """ID последнего события вступления/выхода (для установки курсора после полного обхода)"""
+        result = await self.client(GetAdminLogRequest(
+            channel=self.chat,
+            q='',
+            max_id=0,
+            min_id=0,
+            limit=1,
+            events_filter=ChannelAdminLogEventsFilter(join=True, leave=True, invite=True)
+        ))
+        self.requests += 1
+        return result.events[0].id if result.events else 0
@@ -0,0 +1,143 @@
+import asyncio
+from telethon.tl.functions.channels import GetParticipantsRequest
+from telethon.tl.types import ChannelParticipantsSearch
+from tgstats.config.config import PARTICIPANTS_CONCURRENCY
+from tgstats.logger import get_logger
+
+logger = get_logger('collectors.participants_crawler')
+
+# Список букв, цифр и символов для поиска
+SEARCH_LETTERS = ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l', 'm',
+                  'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x', 'y', 'z',
+                  'а', 'б', 'в', 'г', 'д', 'е', 'ё', 'ж', 'з', 'и', 'й', 'к', 'л', 'м',
+                  'н', 'о', 'п', 'р', 'с', 'т', 'у', 'ф', 'х', 'ц', 'ч', 'ш', 'щ', 'ъ',
+                  'ы', 'ь', 'э', 'ю', 'я',
+                  '0', '1', '2', '3', '4', '5', '6', '7', '8', '9',
+                  '_', '.', '-']
+
+# Размер страницы GetParticipantsRequest
+PAGE_SIZE = 200
+# Сколько результатов Telegram отдает по одному поисковому запросу
+SEARCH_RESULT_CAP = 10000
+# Максимальная длина префикса при расширении дерева поиска
+MAX_PREFIX_LENGTH = 3
+
+class ParticipantsCrawler:
+    """
+    Обход участников канала адаптивным деревом поисковых префиксов.
+
+    Обход начинается с пустого запроса. Префикс расширяется дочерними префиксами
+    (префикс + символ) только если его выдача упирается в ограничение Telegram;
+    префиксы без результатов не расширяются. Обход останавливается, как только
+    число уникальных участников достигает target (participants_count канала).
+
+    Поиски выполняются параллельно (не более concurrency одновременно),
+    уже встреченные пользователи отсеиваются по множеству ID, а новые пользователи
+    отдаются пачками по мере поступления.
+    """
+
+    def __init__(self, client, chat, target=None, concurrency=PARTICIPANTS_CONCURRENCY):
+        self.client = client
+        self.chat = chat
+        self.target = target
+        self.concurrency = concurrency
+        self.seen = set()
+        self.requests = 0
+        self.searched = 0
+        self.expanded = 0
+
+    @property
+    def is_complete(self):
+        """Найдены все участники канала"""
+        return bool(self.target) and len(self.seen) >= self.target
+
+    async def _search(self, prefix, queue):
+        """
+        Постраничный поиск участников по одному префиксу.
+        Возвращает True, если выдача префикса уперлась в ограничение и его нужно расширить
+        (а также при ошибке корневого запроса)
+        """
+        offset = 0
+        fetched = 0
+        count = None
+        while not self.is_complete:
+            try:
+                participants = await self.client(GetParticipantsRequest(
+                    channel=self.chat,
+                    filter=ChannelParticipantsSearch(prefix),
+                    offset=offset,
+                    limit=PAGE_SIZE,
+                    hash=0
+                ))
+                self.requests += 1
+            except Exception as e:
+                logger.error(f"Ошибка при получении участников по префиксу '{prefix}': {str(e)}")
+                # Неудачный корневой запрос расширяется, как насыщенный: обход продолжается
+                # по отдельным символам и дает хотя бы частичное покрытие
+                return prefix == ''
+
+            if count is None:
+                count = getattr(participants, 'count', None)
+            if not participants.users:
+                break
+            fetched += len(participants.users)
+
+            new_users = []
+            for user in participants.users:
+                if user.id not in self.seen:
+                    self.seen.add(user.id)
+                    new_users.append(user)
+            if new_users:
+                await queue.put(new_users)
+                logger.info(f"Получено {len(self.seen)} участников (поиск по '{prefix}')")
+
+            if len(participants.users) < PAGE_SIZE or fetched >= SEARCH_RESULT_CAP:
+                break
+            offset += PAGE_SIZE
+
+        return fetched >= SEARCH_RESULT_CAP or (count is not None and fetched < count)
+
+    async def _worker(self, prefixes, queue):
+        """Берет префиксы из очереди и добавляет в нее дочерние префиксы насыщенных запросов"""
+        while True:
+            prefix = await prefixes.get()
+            try:
+                if self.is_complete:
+                    continue
+                self.searched += 1
+                saturated = await self._search(prefix, queue)
+                if saturated and len(prefix) < MAX_PREFIX_LENGTH and not self.is_complete:
+                    self.expanded += 1
+                    for letter in SEARCH_LETTERS:
+                        prefixes.put_nowait(prefix + letter)
+            finally:
+                prefixes.task_done()
+
+    async def crawl(self, roots=('',)):
+        """Асинхронный генератор пачек новых участников"""
+        queue = asyncio.Queue()
+        prefixes = asyncio.Queue()
+        for root in roots:
+            prefixes.put_nowait(root)
+
+        workers = [asyncio.create_task(self._worker(prefixes, queue)) for _ in range(self.concurrency)]
+        done = asyncio.ensure_future(prefixes.join())
+        # Когда все префиксы обработаны, кладем в очередь маркер конца
+        done.add_done_callback(lambda _: queue.put_nowait(None))
+
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                yield batch
+        finally:
+            done.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        logger.info(
+            f"Обход завершен: {len(self.seen)} из {self.target or '?'} участников, "
+            f"{self.searched} префиксов ({self.expanded} расширено), {self.requests} запросов"
+        )
@@ -1,8 +1,14 @@
+import asyncio
 from datetime import datetime
 from .base import BaseCollector
+from .channel_posts import ChannelPostsCollector
+from .discussion_scan import DiscussionScanner, DISCUSSION_CURSOR_NAME
+from tgstats.config.config import COMMENTS_MODE, COMMENTS_CONCURRENCY
 from tgstats.database.models import PostComment, CommentReaction, ChannelPost
 from tgstats.utils import convert_to_json_serializable
-from sqlalchemy import and_
+from tgstats.database.upsert import bulk_upsert, bulk_insert
+from tgstats.telegram.history import get_reactions, get_reaction_type
+from sqlalchemy import and_, or_, delete
 from tgstats.logger import get_logger
 from telethon.tl.types import PeerUser, PeerChannel, PeerChat, ReactionEmoji
 from telethon.tl.functions.messages import GetDiscussionMessageRequest
@@ -21,135 +27,251 @@ def get_peer_id(peer):
         return peer.chat_id
     return None
 
+def get_comment_row(channel_id, post_id, comment):
+    """Строка post_comments для комментария"""
+    reactions = dict(get_reactions(getattr(comment, 'reactions', None)))
+    return {
+        'channel_id': channel_id,
+        'post_id': post_id,
+        'message_id': comment.id,
+        'user_id': get_peer_id(comment.from_id),
+        'text': comment.text,
+        'date': comment.date.replace(tzinfo=None),
+        'views': comment.views or 0,
+        'forwards': comment.forwards or 0,
+        'likes': reactions.get('👍', 0),
+        'raw': convert_to_json_serializable(comment)
+    }
+
+def get_comment_reaction_rows(comment_id, comment):
+    """Строки comment_reactions из последних реакций комментария (comment_id - ID комментария в базе)"""
+    reactions = getattr(comment, 'reactions', None)
+    rows = []
+    for reaction in getattr(reactions, 'recent_reactions', None) or []:
+        user_id = get_peer_id(reaction.peer_id)
+        reaction_type = get_reaction_type(reaction.reaction)
+        # Строка без ключа реакции нарушила бы NOT NULL и откатила всю пачку поста
+        if user_id and reaction_type is not None:
+            rows.append({
+                'comment_id': comment_id,
+                'user_id': user_id,
+                'reaction': reaction_type,
+                'date': reaction.date.replace(tzinfo=None)
+            })
+    return rows
+
+def comments_changed():
+    """
+    Условие на посты, комментарии которых нужно синхронизировать: счетчик ответов
+    ненулевой и изменился с момента последней полной синхронизации
+    """
+    return and_(
+        ChannelPost.replies > 0,
+        or_(
+            ChannelPost.comments_synced_count.is_(None),
+            ChannelPost.comments_synced_count != ChannelPost.replies
+        )
+    )
+
 class PostCommentsCollector(BaseCollector):
+    # Комментарии собираются к постам, уже сохраненным в базе
+    depends_on = (ChannelPostsCollector,)
+    role = 'comments'
+    
+    def __init__(self, client, db, context=None, mode=COMMENTS_MODE, concurrency=COMMENTS_CONCURRENCY):
+        super().__init__(client, db, context)
+        self.mode = mode
+        self.concurrency = concurrency
+    
     async def run(self, channel):
         """Сбор комментариев к постам канала"""
         logger.info(f"Начало сбора комментариев канала: {channel}")
         
         try:
-            chat = await self.client.get_entity(channel)
+            chat = await self.get_context(channel).get_entity(self.client)
         except ValueError as e:
             logger.error(f"Ошибка при получении информации о канале: {str(e)}")
             return
         
-        # Получаем все посты из базы
+        if self.mode == 'discussion':
+            await self.sync_discussion(chat, channel)
+            return
+        
+        # Получаем из базы только посты с изменившимся счетчиком комментариев
         posts = self.db.query(ChannelPost).filter(
-            ChannelPost.channel_id == chat.id
+            ChannelPost.channel_id == chat.id,
+            comments_changed()
         ).all()
         
-        logger.info(f"Найдено {len(posts)} постов в базе")
+        logger.info(f"Найдено {len(posts)} постов с новыми комментариями")
         
+        # Загрузка обсуждений идет параллельно (не более concurrency постов одновременно),
+        # а сохранение - последовательно в этой корутине, единственной работающей с сессией
+        tasks = asyncio.Queue()
         for post in posts:
-            try:
-                # Получаем комментарии к посту
-                comments = await self.client.get_messages(
-                    chat,
-                    reply_to=post.message_id,
-                    limit=100
-                )
-                
-                if not comments:
-                    logger.debug(f"Пост {post.message_id} не имеет комментариев")
+            # Курсор поста: самый большой ID уже синхронизированного комментария
+            tasks.put_nowait((post.id, post.message_id, post.comments_synced_id or 0))
+        results = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [
+            asyncio.create_task(self._fetch_comments(chat, tasks, results))
+            for _ in range(min(self.concurrency, len(posts)))
+        ]
+        
+        posts_by_id = {post.id: post for post in posts}
+        try:
+            for _ in range(len(posts)):
+                post_id, comments, error = await results.get()
+                post = posts_by_id[post_id]
+                if error is not None:
+                    logger.warning(f"Ошибка при получении комментариев для поста {post.message_id}: {str(error)}")
                     continue
-                
-                logger.info(f"Найдено {len(comments)} комментариев для поста {post.message_id}")
-                
-                # Обрабатываем каждый комментарий
-                for comment in comments:
-                    try:
-                        # Пропускаем комментарии без автора
-                        if not comment.from_id:
-                            logger.debug(f"Пропуск комментария {comment.id} без автора")
-                            continue
-                            
-                        # Проверяем, существует ли уже такой комментарий
-                        existing_comment = self.db.query(PostComment).filter(
-                            and_(
-                                PostComment.channel_id == chat.id,
-                                PostComment.message_id == comment.id
-                            )
-                        ).first()
-                        
-                        comment_data = {
-                            'channel_id': chat.id,
-                            'post_id': post.id,
-                            'message_id': comment.id,
-                            'user_id': get_peer_id(comment.from_id),
-                            'text': comment.text,
-                            'date': comment.date.replace(tzinfo=None),
-                            'views': comment.views or 0,
-                            'forwards': comment.forwards or 0,
-                            'likes': 0,  # Будет обновлено из реакций
-                            'raw': convert_to_json_serializable(comment)
-                        }
-                        
-                        if existing_comment:
-                            # Обновляем существующий комментарий
-                            for key, value in comment_data.items():
-                                setattr(existing_comment, key, value)
-                            
-                            # Удаляем старые реакции
-                            self.db.query(CommentReaction).filter(
-                                CommentReaction.comment_id == comment.id
-                            ).delete()
-                        else:
-                            # Создаем новый комментарий
-                            new_comment = PostComment(**comment_data)
-                            self.db.add(new_comment)
-                            
-                        try:
-                            # Сохраняем комментарий
-                            self.db.commit()
-                            
-                            # Получаем ID сохраненного комментария
-                            comment_id = existing_comment.id if existing_comment else new_comment.id
-                            
-                            # Сохраняем реакции только после успешного сохранения комментария
-                            if hasattr(comment, 'reactions') and comment.reactions:
-                                logger.info(f"Найдены реакции для комментария {comment.id}: {convert_to_json_serializable(comment.reactions)}")
-                                
-                                # Обрабатываем реакции из recent_reactions
-                                if hasattr(comment.reactions, 'recent_reactions'):
-                                    logger.info(f"Тип comment.id: {type(comment.id)}, значение: {comment.id}")
-                                    logger.info(f"Структура комментария: {convert_to_json_serializable(comment)}")
-                                    for reaction in comment.reactions.recent_reactions:
-                                        user_id = get_peer_id(reaction.peer_id)
-                                        if user_id:
-                                            reaction_data = {
-                                                'comment_id': comment_id,  # Используем ID из базы данных
-                                                'user_id': user_id,
-                                                'reaction': str(reaction.reaction.emoticon),
-                                                'date': reaction.date.strftime('%Y-%m-%d %H:%M:%S')
-                                            }
-                                            db_reaction = CommentReaction(**reaction_data)
-                                            self.db.add(db_reaction)
-                                            logger.info(f"Сохранена реакция {reaction_data['reaction']} от пользователя {user_id}")
-                                            
-                                            # Если это лайк, обновляем счетчик лайков
-                                            if reaction_data['reaction'] == '👍':
-                                                comment_data['likes'] += 1
-                                    
-                                    # Сохраняем реакции
-                                    self.db.commit()
-                                    
-                        except Exception as e:
-                            logger.error(f"Ошибка при сохранении комментария {comment.id}: {str(e)}")
-                            self.db.rollback()
-                            continue
-                        
-                    except Exception as e:
-                        logger.warning(f"Ошибка при обработке комментария {comment.id}: {str(e)}")
-                        try:
-                            self.db.rollback()
-                        except:
-                            pass
-                        continue
-                
+                self._save_post_comments(chat, post, comments)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        logger.info("Комментарии успешно сохранены")
+
+    async def _fetch_comments(self, chat, tasks, results):
+        """Воркер: читает обсуждения постов от курсора вперед и передает комментарии на сохранение"""
+        while True:
+            try:
+                post_id, message_id, synced_id = tasks.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                comments = [
+                    comment async for comment in self.client.iter_messages(
+                        chat,
+                        reply_to=message_id,
+                        min_id=synced_id,
+                        reverse=True
+                    )
+                ]
+                await results.put((post_id, comments, None))
             except Exception as e:
-                logger.warning(f"Ошибка при получении комментариев для поста {post.message_id}: {str(e)}")
+                await results.put((post_id, None, e))
+
+    def _save_post_comments(self, chat, post, comments):
+        """
+        Сохраняет пачку новых комментариев поста: комментарии - одним INSERT ... ON CONFLICT,
+        реакции заменяются одним DELETE и одним INSERT; курсор поста сдвигается в той же транзакции.
+        Возвращает False, если пачку сохранить не удалось (курсор остается на месте)
+        """
+        try:
+            # Пропускаем комментарии без автора
+            comments_with_author = [comment for comment in comments if comment.from_id]
+            rows = [get_comment_row(chat.id, post.id, comment) for comment in comments_with_author]
+            comment_ids = dict(bulk_upsert(
+                self.db, PostComment, rows,
+                index_elements=('channel_id', 'message_id'),
+                returning=('message_id', 'id')
+            ))
+            
+            reaction_rows = [
+                row for comment in comments_with_author
+                for row in get_comment_reaction_rows(comment_ids[comment.id], comment)
+            ]
+            if comment_ids:
+                self.db.execute(delete(CommentReaction).where(
+                    CommentReaction.comment_id.in_(list(comment_ids.values()))
+                ))
+            bulk_insert(self.db, CommentReaction, reaction_rows)
+            
+            # Обсуждение прочитано полностью - запоминаем счетчик, с которым оно синхронизировано
+            if comments:
+                post.comments_synced_id = max(post.comments_synced_id or 0, max(comment.id for comment in comments))
+            post.comments_synced_count = post.replies
+            self.db.commit()
+            
+            if comments:
+                logger.info(f"Сохранено {len(rows)} новых комментариев и {len(reaction_rows)} реакций для поста {post.message_id}")
+            else:
+                logger.debug(f"Пост {post.message_id} не имеет новых комментариев")
+            return True
+            
+        except Exception as e:
+            logger.warning(f"Ошибка при сохранении комментариев для поста {post.message_id}: {str(e)}")
+            self.db.rollback()
+            return False
+
+    async def sync_discussion(self, chat, channel):
+        """
+        Сбор комментариев одним проходом по истории связанной группы обсуждения
+        от сохраненного курсора. Ответы относятся к постам по верхнему сообщению треда.
+        """
+        context = self.get_context(channel)
+        full_channel = await context.get_full_channel()
+        linked_chat_id = getattr(full_channel.full_chat, 'linked_chat_id', None)
+        if not linked_chat_id:
+            logger.info(f"У канала {chat.id} нет группы обсуждения")
+            return
+        
+        # Сущность группы из полной информации о канале годится только для клиента контекста
+        group = None
+        if self.client is context.client:
+            group = next((c for c in full_channel.chats if c.id == linked_chat_id), None)
+        if group is None:
+            group = await self.client.get_entity(PeerChannel(linked_chat_id))
+        
+        scanner = DiscussionScanner(self.client, chat, group)
+        cursor = self.db.get_cursor(chat.id, DISCUSSION_CURSOR_NAME)
+        min_id = cursor.last_id or 0
+        if not min_id:
+            # Первый проход начинаем с границы окна обновления, а не с начала истории группы
+            min_id = await scanner.get_start_id(context.window_start)
+        
+        threads, thread_posts, last_id = await scanner.scan(min_id)
+        
+        # Запоминаем копии постов, встреченные в истории группы
+        for top_id, post_id in thread_posts.items():
+            self.db.query(ChannelPost).filter(
+                ChannelPost.channel_id == chat.id,
+                ChannelPost.message_id == post_id
+            ).update({ChannelPost.discussion_msg_id: top_id}, synchronize_session=False)
+        
+        posts = {
+            post.discussion_msg_id: post for post in self.db.query(ChannelPost).filter(
+                ChannelPost.channel_id == chat.id,
+                ChannelPost.discussion_msg_id.in_(list(threads))
+            ).all()
+        }
+        
+        # Верхние сообщения тредов, которые раньше не встречались, запрашиваем пачками по ID
+        unknown = [top_id for top_id in threads if top_id not in posts]
+        if unknown:
+            resolved = await scanner.resolve_posts(unknown)
+            for top_id, post_id in resolved.items():
+                post = self.db.query(ChannelPost).filter(
+                    ChannelPost.channel_id == chat.id,
+                    ChannelPost.message_id == post_id
+                ).first()
+                if post is not None:
+                    post.discussion_msg_id = top_id
+                    posts[top_id] = post
+        self.db.commit()
+        
+        failed_id = None
+        saved = 0
+        for top_id, comments in threads.items():
+            post = posts.get(top_id)
+            if post is None:
+                # Тред не относится к посту канала (обычная переписка в группе)
                 continue
+            if self._save_post_comments(chat, post, comments):
+                saved += len(comments)
+            else:
+                first_id = min(comment.id for comment in comments)
+                failed_id = min(failed_id or first_id, first_id)
         
-        logger.info("Комментарии успешно сохранены")
+        # При ошибках курсор останавливается перед первым несохраненным комментарием
+        cursor = self.db.get_cursor(chat.id, DISCUSSION_CURSOR_NAME)
+        cursor.last_id = failed_id - 1 if failed_id else last_id
+        cursor.last_date = datetime.utcnow()
+        self.db.commit()
+        
+        logger.info(f"Из группы обсуждения сохранено {saved} комментариев к {len(posts)} постам")
 
     async def collect_comments(self):
         """Collect comments for all posts in the channel."""
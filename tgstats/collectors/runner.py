@@ -0,0 +1,140 @@
+import asyncio
+from .context import CollectionContext
+from .channel_stats import ChannelStatsCollector
+from .channel_posts import ChannelPostsCollector
+from .channel_participants import ChannelParticipantsCollector
+from .channel_activity import ChannelActivityCollector
+from .discussion_stats import DiscussionStatsCollector
+from .post_comments import PostCommentsCollector
+from .broadcast_stats import BroadcastStatsCollector
+from tgstats.telegram.pool import ClientPool
+from tgstats.database import unit_of_work
+from tgstats.config.config import COLLECT_CONCURRENCY, CHANNEL_CONCURRENCY
+from tgstats.logger import get_logger
+
+logger = get_logger('collectors.runner')
+
+# Коллекторы одного прогона; порядок запуска определяется зависимостями (depends_on)
+DEFAULT_COLLECTORS = [
+    ChannelStatsCollector,
+    ChannelPostsCollector,
+    ChannelParticipantsCollector,
+    ChannelActivityCollector,
+    DiscussionStatsCollector,
+    PostCommentsCollector,
+    BroadcastStatsCollector
+]
+
+def get_channel_peer(channel):
+    """Приводит идентификатор канала из конфигурации к виду, понятному клиенту"""
+    if isinstance(channel, str) and channel.isdigit():
+        logger.info(f"Используется ID канала: {channel}")
+        return int(channel)
+    logger.info(f"Используется юзернейм канала: {channel}")
+    return channel
+
+class CollectorRunner:
+    """
+    Параллельный запуск коллекторов по нескольким каналам.
+
+    Коллекторы одного канала образуют граф зависимостей: коллектор стартует,
+    как только завершились все коллекторы из его depends_on. Общее число
+    одновременно работающих коллекторов ограничено max_concurrency, число
+    коллекторов одного канала - channel_concurrency. Каждый коллектор работает
+    в собственной сессии базы данных.
+
+    Вместо одного клиента можно передать пул клиентов (ClientPool): тогда запросы
+    коллектора идут через аккаунт, выбранный по его роли и номеру канала.
+    """
+
+    def __init__(self, client, db, collectors=None, max_concurrency=COLLECT_CONCURRENCY,
+                 channel_concurrency=CHANNEL_CONCURRENCY):
+        self.pool = client if isinstance(client, ClientPool) else ClientPool([client])
+        self.db = db
+        self.collectors = collectors or DEFAULT_COLLECTORS
+        self.channel_concurrency = channel_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._check_graph()
+
+    def _check_graph(self):
+        """Проверяет, что все зависимости входят в набор коллекторов и граф не содержит циклов"""
+        known = set(self.collectors)
+        for collector_cls in self.collectors:
+            missing = [dep.__name__ for dep in collector_cls.depends_on if dep not in known]
+            if missing:
+                raise ValueError(f"Коллектор {collector_cls.__name__} зависит от незапускаемых коллекторов: {missing}")
+
+        visited, in_progress = set(), set()
+
+        def visit(collector_cls):
+            if collector_cls in visited:
+                return
+            if collector_cls in in_progress:
+                raise ValueError(f"Циклическая зависимость коллекторов: {collector_cls.__name__}")
+            in_progress.add(collector_cls)
+            for dep in collector_cls.depends_on:
+                visit(dep)
+            in_progress.remove(collector_cls)
+            visited.add(collector_cls)
+
+        for collector_cls in self.collectors:
+            visit(collector_cls)
+
+    async def run(self, channels):
+        """Сбор статистики по всем каналам"""
+        await asyncio.gather(*(self.run_channel(channel, shard) for shard, channel in enumerate(channels)))
+
+    async def run_channel(self, channel, shard=0):
+        """Сбор статистики для одного канала; shard - номер канала для распределения по аккаунтам"""
+        try:
+            channel_peer = get_channel_peer(channel)
+            context_db = self.db.fork()
+            context = CollectionContext(self.pool.get('history', shard), context_db, channel_peer)
+            channel_semaphore = asyncio.Semaphore(self.channel_concurrency)
+            tasks = {}
+
+            async def run_collector(collector_cls):
+                # Ждем завершения зависимостей; их ошибки не блокируют запуск,
+                # как и при последовательном сборе
+                await asyncio.gather(*(tasks[dep] for dep in collector_cls.depends_on), return_exceptions=True)
+
+                # Каждый коллектор работает в своей единице работы (сессии) на общем движке.
+                # Сначала занимаем слот канала, затем общий: иначе ожидающие своего канала
+                # коллекторы простаивали бы на общих слотах
+                async with channel_semaphore, self._semaphore:
+                    with unit_of_work(engine=self.db.engine) as db:
+                        collector = collector_cls(self.pool.get(collector_cls.role, shard), db, context)
+                        try:
+                            logger.info(f"Запуск коллектора {collector_cls.__name__} для канала {channel}")
+                            await collector.run(channel_peer)
+                            logger.info(f"Коллектор {collector_cls.__name__} успешно завершил работу для канала {channel}")
+                        except Exception as e:
+                            logger.error(f"Ошибка в коллекторе {collector_cls.__name__} для канала {channel}: {str(e)}", exc_info=True)
+                            raise
+
+            # Задачи создаются в порядке зависимостей, поэтому задачи зависимостей уже существуют
+            for collector_cls in self._ordered():
+                tasks[collector_cls] = asyncio.create_task(run_collector(collector_cls))
+
+            try:
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+            finally:
+                context_db.close()
+
+        except Exception as e:
+            logger.error(f"Ошибка при сборе статистики для канала {channel}: {str(e)}", exc_info=True)
+
+    def _ordered(self):
+        """Коллекторы в топологическом порядке"""
+        ordered = []
+
+        def visit(collector_cls):
+            if collector_cls in ordered:
+                return
+            for dep in collector_cls.depends_on:
+                visit(dep)
+            ordered.append(collector_cls)
+
+        for collector_cls in self.collectors:
+            visit(collector_cls)
+        return ordered
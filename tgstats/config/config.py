@@ -4,6 +4,20 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
+def parse_rate_limits(value):
+    """
+    Разбирает бюджеты запросов к Telegram вида
+    "GetHistoryRequest=1/5,GetParticipantsRequest=0.5/3" (метод=запросов_в_секунду/пачка)
+    """
+    limits = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        method, budget = item.split('=', 1)
+        rate, _, burst = budget.partition('/')
+        limits[method.strip()] = (float(rate), int(burst or 1))
+    return limits
+
 class Config:
     def __init__(self):
         # Telegram API credentials
@@ -12,6 +26,8 @@ class Config:
 
         # Session configuration
         self.SESSION_PATH = os.getenv('SESSION_PATH', 'tgstats.session')
+        # Сессии нескольких аккаунтов через запятую (пути к .session или строки StringSession)
+        self.SESSIONS = [s.strip() for s in os.getenv('TG_SESSIONS', '').split(',') if s.strip()]
 
         # Channel configuration
         channel_ids = os.getenv('TG_CHANNEL_IDS', '').split(',') if os.getenv('TG_CHANNEL_IDS') else []
@@ -28,6 +44,37 @@ class Config:
         self.CHANNEL_ID = os.getenv('TG_CHANNEL_ID')
         self.CHANNEL_TITLE = os.getenv('TG_CHANNEL_TITLE', 'Unknown Channel')
 
+        # Параллельный сбор: общий лимит одновременно работающих коллекторов
+        # и лимит коллекторов одного канала
+        self.COLLECT_CONCURRENCY = int(os.getenv('TG_COLLECT_CONCURRENCY', '8'))
+        self.CHANNEL_CONCURRENCY = int(os.getenv('TG_CHANNEL_CONCURRENCY', '3'))
+
+        # Число одновременных поисков при обходе участников канала
+        self.PARTICIPANTS_CONCURRENCY = int(os.getenv('TG_PARTICIPANTS_CONCURRENCY', '4'))
+
+        # Отток участников: минимальная доля обойденных участников, при которой отсутствующие
+        # считаются вышедшими, и размер выборки для проверки вышедших через API (0 - без проверки)
+        self.CHURN_MIN_COVERAGE = float(os.getenv('TG_CHURN_MIN_COVERAGE', '0.95'))
+        self.CHURN_PROBE_SAMPLE = int(os.getenv('TG_CHURN_PROBE_SAMPLE', '0'))
+
+        # Ограничение запросов к Telegram: бюджеты по методам и поведение при FloodWait
+        self.RATE_LIMITS = parse_rate_limits(os.getenv('TG_RATE_LIMITS', ''))
+        self.FLOOD_MAX_RETRIES = int(os.getenv('TG_FLOOD_MAX_RETRIES', '5'))
+        self.FLOOD_MAX_WAIT = int(os.getenv('TG_FLOOD_MAX_WAIT', '3600'))
+
+        # Режим сбора комментариев: discussion - один проход по истории группы обсуждения,
+        # per_post - отдельные запросы ответов к каждому посту
+        self.COMMENTS_MODE = os.getenv('TG_COMMENTS_MODE', 'per_post')
+        # Число постов, обсуждения которых загружаются одновременно (режим per_post)
+        self.COMMENTS_CONCURRENCY = int(os.getenv('TG_COMMENTS_CONCURRENCY', '4'))
+
+        # Загрузка истории каналов: сессия takeout-клиента и размер пачки сообщений
+        self.BACKFILL_SESSION = os.getenv('TG_BACKFILL_SESSION', 'tg-backfill.session')
+        self.BACKFILL_CHUNK_SIZE = int(os.getenv('TG_BACKFILL_CHUNK_SIZE', '1000'))
+
+        # Время жизни записей кэша сущностей Telegram (в часах)
+        self.ENTITY_CACHE_TTL = float(os.getenv('TG_ENTITY_CACHE_TTL', '24'))
+
         # Logging configuration
         self.LOG_LEVEL = os.getenv("TG_LOG_LEVEL", "INFO")
         self.LOG_FORMAT = os.getenv("TG_LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
@@ -40,6 +87,12 @@ class Config:
         self.POSTGRES_USER = os.getenv('POSTGRES_USER', '')
         self.POSTGRES_PASSWORD = os.getenv('POSTGRES_PASSWORD', '')
 
+        # Пул соединений общего движка базы данных
+        self.POSTGRES_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', '10'))
+        self.POSTGRES_MAX_OVERFLOW = int(os.getenv('POSTGRES_MAX_OVERFLOW', '10'))
+        self.POSTGRES_POOL_PRE_PING = os.getenv('POSTGRES_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+        self.POSTGRES_POOL_RECYCLE = int(os.getenv('POSTGRES_POOL_RECYCLE', '1800'))
+
         self.TABLE_NAME = os.getenv('TABLE_NAME', "tgstat")
 
         # Параметры подключения к PostgreSQL в виде словаря
@@ -55,10 +108,24 @@ class Config:
 API_ID = os.getenv('TG_API_ID')
 API_HASH = os.getenv('TG_API_HASH')
 SESSION_PATH = os.getenv('SESSION_PATH', 'tgstats.session')
+SESSIONS = [s.strip() for s in os.getenv('TG_SESSIONS', '').split(',') if s.strip()]
 CHANNEL_IDS = [int(id.strip()) for id in os.getenv('TG_CHANNEL_IDS', '').split(',') if id.strip()]
 CHANNEL_USERNAME = os.getenv('TG_CHANNEL_USERNAME', '')
 CHANNEL_ID = os.getenv('TG_CHANNEL_ID')
 CHANNEL_TITLE = os.getenv('TG_CHANNEL_TITLE', 'Unknown Channel')
+COLLECT_CONCURRENCY = int(os.getenv('TG_COLLECT_CONCURRENCY', '8'))
+CHANNEL_CONCURRENCY = int(os.getenv('TG_CHANNEL_CONCURRENCY', '3'))
+PARTICIPANTS_CONCURRENCY = int(os.getenv('TG_PARTICIPANTS_CONCURRENCY', '4'))
+CHURN_MIN_COVERAGE = float(os.getenv('TG_CHURN_MIN_COVERAGE', '0.95'))
+CHURN_PROBE_SAMPLE = int(os.getenv('TG_CHURN_PROBE_SAMPLE', '0'))
+RATE_LIMITS = parse_rate_limits(os.getenv('TG_RATE_LIMITS', ''))
+FLOOD_MAX_RETRIES = int(os.getenv('TG_FLOOD_MAX_RETRIES', '5'))
+FLOOD_MAX_WAIT = int(os.getenv('TG_FLOOD_MAX_WAIT', '3600'))
+COMMENTS_MODE = os.getenv('TG_COMMENTS_MODE', 'per_post')
+COMMENTS_CONCURRENCY = int(os.getenv('TG_COMMENTS_CONCURRENCY', '4'))
+BACKFILL_SESSION = os.getenv('TG_BACKFILL_SESSION', 'tg-backfill.session')
+BACKFILL_CHUNK_SIZE = int(os.getenv('TG_BACKFILL_CHUNK_SIZE', '1000'))
+ENTITY_CACHE_TTL = float(os.getenv('TG_ENTITY_CACHE_TTL', '24'))
 LOG_LEVEL = os.getenv("TG_LOG_LEVEL", "INFO")
 LOG_FORMAT = os.getenv("TG_LOG_FORMAT", "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 LOG_FILE = os.getenv("TG_LOG_FILE", "tgstats.log")
@@ -69,17 +136,39 @@ PG_CONNECTION_PARAMS = {
     'user': os.getenv('POSTGRES_USER', ''),
     'password': os.getenv('POSTGRES_PASSWORD', '')
 }
+POSTGRES_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', '10'))
+POSTGRES_MAX_OVERFLOW = int(os.getenv('POSTGRES_MAX_OVERFLOW', '10'))
+POSTGRES_POOL_PRE_PING = os.getenv('POSTGRES_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+POSTGRES_POOL_RECYCLE = int(os.getenv('POSTGRES_POOL_RECYCLE', '1800'))
 
 __all__ = [
     'Config',
     'API_ID',
     'API_HASH',
     'SESSION_PATH',
+    'SESSIONS',
     'CHANNEL_USERNAME',
     'CHANNEL_ID',
     'CHANNEL_TITLE',
+    'COLLECT_CONCURRENCY',
+    'CHANNEL_CONCURRENCY',
+    'PARTICIPANTS_CONCURRENCY',
+    'CHURN_MIN_COVERAGE',
+    'CHURN_PROBE_SAMPLE',
+    'RATE_LIMITS',
+    'FLOOD_MAX_RETRIES',
+    'FLOOD_MAX_WAIT',
+    'COMMENTS_MODE',
+    'COMMENTS_CONCURRENCY',
+    'BACKFILL_SESSION',
+    'BACKFILL_CHUNK_SIZE',
+    'ENTITY_CACHE_TTL',
     'LOG_LEVEL',
     'LOG_FORMAT',
     'LOG_FILE',
-    'PG_CONNECTION_PARAMS'
+    'PG_CONNECTION_PARAMS',
+    'POSTGRES_POOL_SIZE',
+    'POSTGRES_MAX_OVERFLOW',
+    'POSTGRES_POOL_PRE_PING',
+    'POSTGRES_POOL_RECYCLE'
 ] 
\ No newline at end of file
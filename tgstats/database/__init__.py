@@ -1,4 +1,5 @@
-from .database import Database
+from .database import Database, unit_of_work
+from .engine import get_engine, dispose_engines
 
 # Создаем глобальный экземпляр базы данных
 _db = None
@@ -13,4 +14,4 @@ def get_db():
         _db = Database()
     return _db
 
-__all__ = ['Database', 'get_db']
+__all__ = ['Database', 'unit_of_work', 'get_engine', 'dispose_engines', 'get_db']
@@ -1,8 +1,7 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
 from sqlalchemy.orm import sessionmaker
-from tgstats.database.models import Base, ChannelParticipant
-from tgstats.config.config import PG_CONNECTION_PARAMS
-from tgstats.database.schema import update_schema
+from tgstats.database.models import Base, ChannelParticipant, CollectorCursor
+from tgstats.database.engine import get_engine
 from tgstats.logger import get_logger
 from typing import List, Dict, Any, Optional
 from sqlalchemy import text
@@ -10,23 +9,15 @@ from sqlalchemy import text
 logger = get_logger(__name__)
 
 class Database:
-    def __init__(self, config=None):
-        # Формируем URL для подключения из параметров
+    def __init__(self, config=None, engine=None):
+        # Движок берется из общего реестра процесса (схема на нем уже проверена);
+        # у каждого экземпляра своя сессия и своя транзакция
+        if engine is None:
+            engine = get_engine(config.PG_CONNECTION_PARAMS if config else None)
         if config:
             self.config = config
-            db_url = f"postgresql://{config.PG_CONNECTION_PARAMS['user']}:{config.PG_CONNECTION_PARAMS['password']}@{config.PG_CONNECTION_PARAMS['host']}:{config.PG_CONNECTION_PARAMS['port']}/{config.PG_CONNECTION_PARAMS['database']}"
-        else:
-            db_url = f"postgresql://{PG_CONNECTION_PARAMS['user']}:{PG_CONNECTION_PARAMS['password']}@{PG_CONNECTION_PARAMS['host']}:{PG_CONNECTION_PARAMS['port']}/{PG_CONNECTION_PARAMS['database']}"
-        
-        self.engine = create_engine(db_url)
-        
-        # Проверяем и обновляем схему базы данных
-        if not update_schema(self.engine):
-            logger.error("Не удалось обновить схему базы данных")
-            raise Exception("Ошибка обновления схемы базы данных")
-        
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        self.engine = engine
+        self.session = sessionmaker(bind=self.engine)()
     
     def __enter__(self):
         return self.session
@@ -34,6 +25,13 @@ class Database:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.session.close()
     
+    def fork(self):
+        """Новый экземпляр с собственной сессией на том же движке (для параллельных коллекторов)"""
+        return Database(engine=self.engine)
+    
+    def close(self):
+        self.session.close()
+    
     def query(self, *args):
         return self.session.query(*args)
     
@@ -45,6 +43,12 @@ class Database:
     
     def flush(self):
         self.session.flush()
+    
+    def rollback(self):
+        self.session.rollback()
+    
+    def execute(self, statement, params=None):
+        return self.session.execute(statement, params)
 
     def get_channel_participants(self, channel_id: int) -> List[Dict[str, Any]]:
         """Получение списка участников канала"""
@@ -76,4 +80,33 @@ class Database:
         return self.session.query(ChannelParticipant).filter(
             ChannelParticipant.channel_id == channel_id,
             ChannelParticipant.user_id == user_id
-        ).first() 
\ No newline at end of file
+        ).first() 
+
+    def get_cursor(self, channel_id: int, name: str) -> CollectorCursor:
+        """Получение курсора коллектора для канала (создается при первом обращении)"""
+        cursor = self.session.query(CollectorCursor).filter(
+            CollectorCursor.channel_id == channel_id,
+            CollectorCursor.name == name
+        ).first()
+
+        if cursor is None:
+            cursor = CollectorCursor(channel_id=channel_id, name=name, last_id=0)
+            self.session.add(cursor)
+        return cursor
+
+@contextmanager
+def unit_of_work(config=None, engine=None):
+    """
+    Единица работы коллектора или задачи: отдельная сессия на общем движке.
+    При успешном завершении транзакция фиксируется, при ошибке откатывается,
+    соединение в любом случае возвращается в пул
+    """
+    db = Database(config, engine)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
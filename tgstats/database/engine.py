@@ -0,0 +1,52 @@
+import threading
+from sqlalchemy import create_engine
+from tgstats.database.schema import update_schema
+from tgstats.config.config import (
+    PG_CONNECTION_PARAMS, POSTGRES_POOL_SIZE, POSTGRES_MAX_OVERFLOW,
+    POSTGRES_POOL_PRE_PING, POSTGRES_POOL_RECYCLE
+)
+from tgstats.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Движки процесса по URL подключения: один пул соединений на базу данных
+_engines = {}
+_lock = threading.Lock()
+
+def get_database_url(params=None):
+    """URL подключения к PostgreSQL из параметров (по умолчанию - из переменных окружения)"""
+    params = params or PG_CONNECTION_PARAMS
+    return f"postgresql://{params['user']}:{params['password']}@{params['host']}:{params['port']}/{params['database']}"
+
+def get_engine(params=None):
+    """
+    Общий движок для базы данных. Создается при первом обращении с настройками
+    пула из конфигурации; схема проверяется и обновляется один раз на движок
+    """
+    url = get_database_url(params)
+    with _lock:
+        engine = _engines.get(url)
+        if engine is None:
+            engine = create_engine(
+                url,
+                pool_size=POSTGRES_POOL_SIZE,
+                max_overflow=POSTGRES_MAX_OVERFLOW,
+                pool_pre_ping=POSTGRES_POOL_PRE_PING,
+                pool_recycle=POSTGRES_POOL_RECYCLE
+            )
+            
+            # Проверяем и обновляем схему базы данных
+            if not update_schema(engine):
+                engine.dispose()
+                logger.error("Не удалось обновить схему базы данных")
+                raise Exception("Ошибка обновления схемы базы данных")
+            
+            _engines[url] = engine
+        return engine
+
+def dispose_engines():
+    """Закрывает пулы соединений всех движков (при завершении процесса)"""
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
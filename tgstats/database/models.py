@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Text, Boolean, BigInteger, Index, Float, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Text, Boolean, BigInteger, Index, Float, UniqueConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, foreign
 from datetime import datetime
@@ -53,11 +53,21 @@ class ChannelPost(Base):
     replies = Column(Integer, nullable=True)
     media_type = Column(String, nullable=True)
     raw = Column(JSON)
+    # Курсор синхронизации комментариев: ID последнего сохраненного комментария
+    comments_synced_id = Column(BigInteger, nullable=True)
+    # Значение счетчика replies на момент последней полной синхронизации комментариев
+    comments_synced_count = Column(Integer, nullable=True)
+    # ID автоматической копии поста в связанной группе обсуждения
+    discussion_msg_id = Column(BigInteger, nullable=True)
 
     # Связь с реакциями
     reactions = relationship("PostReaction", back_populates="post")
     comments = relationship("PostComment", back_populates="post")
 
+    __table_args__ = (
+        UniqueConstraint('channel_id', 'message_id', name='uq_channel_posts_channel_message'),
+    )
+
 class PostReaction(Base):
     __tablename__ = 'post_reactions'
 
@@ -70,6 +80,10 @@ class PostReaction(Base):
     # Связи
     post = relationship("ChannelPost", back_populates="reactions")
 
+    __table_args__ = (
+        UniqueConstraint('post_id', 'reaction', name='uq_post_reactions_post_reaction'),
+    )
+
 class ChannelActivity(Base):
     __tablename__ = 'channel_activity'
 
@@ -116,6 +130,28 @@ class HourlyActivity(Base):
     # Индекс для быстрого поиска по дате и часу
     __table_args__ = (
         Index('idx_hourly_activity_date_hour', 'date', 'hour'),
+        UniqueConstraint('channel_id', 'date', 'hour', name='uq_hourly_activity_channel_date_hour'),
+    )
+
+class ChannelStatsPoint(Base):
+    """Точка временного ряда из графиков статистики канала (stats.getBroadcastStats)"""
+    __tablename__ = 'channel_stats_points'
+
+    id = Column(Integer, primary_key=True)
+    channel_id = Column(BigInteger, nullable=False)
+    graph = Column(String(64), nullable=False)  # Имя графика, например growth_graph или summary
+    series = Column(String(128), nullable=False)  # Имя ряда внутри графика
+    x = Column(BigInteger, nullable=False)  # Значение оси X (для временных рядов - время в мс)
+    date = Column(DateTime, nullable=True)  # Время точки, если ось X временная
+    value = Column(Float)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ChannelStatsPoint(channel_id={self.channel_id}, graph={self.graph}, series={self.series}, x={self.x})>"
+
+    __table_args__ = (
+        Index('idx_channel_stats_points_date', 'date'),
+        UniqueConstraint('channel_id', 'graph', 'series', 'x', name='uq_channel_stats_points_point'),
     )
 
 class PostComment(Base):
@@ -144,6 +180,7 @@ class PostComment(Base):
         Index('idx_post_comments_post_id', 'post_id'),
         Index('idx_post_comments_user_id', 'user_id'),
         Index('idx_post_comments_date', 'date'),
+        UniqueConstraint('channel_id', 'message_id', name='uq_post_comments_channel_message'),
     )
 
 class CommentReaction(Base):
@@ -166,3 +203,39 @@ class CommentReaction(Base):
         Index('ix_comment_reactions_user_id', 'user_id'),
         Index('ix_comment_reactions_date', 'date'),
     )
+
+class CollectorCursor(Base):
+    """Курсор инкрементального сбора данных по каналу"""
+    __tablename__ = 'collector_cursors'
+
+    id = Column(Integer, primary_key=True)
+    channel_id = Column(BigInteger, nullable=False)
+    name = Column(String(64), nullable=False)  # Имя коллектора, которому принадлежит курсор
+    last_id = Column(BigInteger, default=0)  # Самый новый обработанный ID
+    last_date = Column(DateTime, nullable=True)  # Граница окна обновления или время последней синхронизации
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<CollectorCursor(channel_id={self.channel_id}, name={self.name}, last_id={self.last_id})>"
+
+    __table_args__ = (
+        UniqueConstraint('channel_id', 'name', name='uq_collector_cursors_channel_name'),
+    )
+
+class TelegramEntity(Base):
+    """Кэш сущностей Telegram (каналы, пользователи) вместе с access_hash"""
+    __tablename__ = 'telegram_entities'
+
+    id = Column(Integer, primary_key=True)
+    account_id = Column(BigInteger, nullable=False, default=0)  # Аккаунт, для которого действителен access_hash
+    peer_id = Column(BigInteger, nullable=False)  # ID в формате Telethon (для каналов -100...)
+    entity_type = Column(String(16))  # 'channel', 'user', 'chat'
+    access_hash = Column(BigInteger, nullable=True)
+    username = Column(String, nullable=True)
+    data = Column(LargeBinary)  # Сериализованный объект Telethon
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_telegram_entities_username', 'username'),
+        UniqueConstraint('account_id', 'peer_id', name='uq_telegram_entities_account_peer'),
+    )
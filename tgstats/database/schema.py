@@ -1,4 +1,4 @@
-from sqlalchemy import inspect, text
+from sqlalchemy import inspect, text, UniqueConstraint
 from sqlalchemy.exc import SQLAlchemyError
 from tgstats.database.models import Base
 from tgstats.logger import get_logger
@@ -82,6 +82,59 @@ def add_missing_columns(engine, table_name, missing_columns, table):
         logger.error(f"Ошибка при добавлении колонок в таблицу {table_name}: {str(e)}")
         return False
 
+def get_missing_unique_constraints(engine, table):
+    """Именованные ограничения уникальности модели, которых еще нет в таблице"""
+    inspector = inspect(engine)
+    existing = {constraint['name'] for constraint in inspector.get_unique_constraints(table.name)}
+    return [
+        constraint for constraint in table.constraints
+        if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in existing
+    ]
+
+def add_unique_constraint(engine, table, constraint):
+    """
+    Добавляет ограничение уникальности в существующую таблицу. Дубликаты ключа
+    удаляются (остается строка с наибольшим id), ссылки на них из других таблиц
+    переносятся на оставшуюся строку. Строки с NULL в ключе дубликатами не считаются,
+    как и в самом ограничении
+    """
+    columns = ', '.join(column.name for column in constraint.columns)
+    not_null = ' AND '.join(f"{column.name} IS NOT NULL" for column in constraint.columns)
+    duplicates = (
+        f"SELECT id, max(id) OVER (PARTITION BY {columns}) AS keep_id FROM {table.name} "
+        f"WHERE {not_null}"
+    )
+    try:
+        with engine.begin() as connection:
+            for child in Base.metadata.sorted_tables:
+                for foreign_key in child.foreign_keys:
+                    if foreign_key.column.table is not table:
+                        continue
+                    column = foreign_key.parent.name
+                    result = connection.execute(text(
+                        f"UPDATE {child.name} SET {column} = d.keep_id "
+                        f"FROM ({duplicates}) AS d "
+                        f"WHERE {child.name}.{column} = d.id AND d.id <> d.keep_id"
+                    ))
+                    if result.rowcount:
+                        logger.info(f"Перенесено {result.rowcount} ссылок {child.name}.{column} с дубликатов {table.name}")
+            
+            result = connection.execute(text(
+                f"DELETE FROM {table.name} USING ({duplicates}) AS d "
+                f"WHERE {table.name}.id = d.id AND d.id <> d.keep_id"
+            ))
+            if result.rowcount:
+                logger.info(f"Удалено {result.rowcount} дубликатов из таблицы {table.name}")
+            
+            connection.execute(text(
+                f"ALTER TABLE {table.name} ADD CONSTRAINT {constraint.name} UNIQUE ({columns})"
+            ))
+            logger.info(f"Добавлено ограничение {constraint.name} в таблицу {table.name}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка при добавлении ограничения {constraint.name} в таблицу {table.name}: {str(e)}")
+        return False
+
 def update_schema(engine):
     """Безопасно обновляет схему базы данных"""
     logger.info("Начало обновления схемы базы данных")
@@ -105,6 +158,15 @@ def update_schema(engine):
             if not add_missing_columns(engine, table_name, missing_columns, table):
                 return False
         
+        # Добавляем ограничения уникальности (в порядке зависимостей таблиц,
+        # чтобы дубликаты родительских строк были устранены раньше дочерних)
+        for table in Base.metadata.sorted_tables:
+            if table.name in compatibility['missing_tables']:
+                continue
+            for constraint in get_missing_unique_constraints(engine, table):
+                if not add_unique_constraint(engine, table, constraint):
+                    return False
+        
         logger.info("Схема базы данных успешно обновлена")
         return True
         
@@ -1,12 +1,10 @@
 from sqlalchemy.orm import sessionmaker
 from tgstats.database.models import Base
-from tgstats.database.database import Database
-
-db = Database()
-Session = sessionmaker(bind=db.engine)
+from tgstats.database.engine import get_engine
 
 def init_db():
-    Base.metadata.create_all(db.engine)
+    Base.metadata.create_all(get_engine())
 
 def get_session():
-    return Session()
+    # Движок создается при первом обращении, а не при импорте модуля
+    return sessionmaker(bind=get_engine())()
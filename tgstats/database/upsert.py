@@ -0,0 +1,70 @@
+import csv
+import io
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import insert as plain_insert
+from sqlalchemy.dialects.postgresql import insert
+
+# Сколько строк вставлять одним оператором (ограничение PostgreSQL - 65535 параметров)
+UPSERT_BATCH_SIZE = 1000
+# Обозначение NULL в потоке COPY
+COPY_NULL = '\\N'
+
+def bulk_upsert(db, model, rows: List[Dict[str, Any]], index_elements: Sequence[str],
+                update_columns: Optional[Sequence[str]] = None,
+                returning: Optional[Sequence[str]] = None) -> list:
+    """
+    Вставляет строки пачками через INSERT ... ON CONFLICT (index_elements) DO UPDATE.
+
+    update_columns - колонки, обновляемые у существующих строк (по умолчанию все
+    переданные, кроме ключа). returning - колонки, возвращаемые для каждой строки.
+    Строки с одинаковым ключом схлопываются (остается последняя): один оператор
+    не может обновить строку дважды.
+    """
+    if not rows:
+        return []
+
+    unique_rows = {tuple(row[key] for key in index_elements): row for row in rows}
+    rows = list(unique_rows.values())
+    if update_columns is None:
+        update_columns = [column for column in rows[0] if column not in index_elements]
+
+    table = model.__table__
+    result = []
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        stmt = insert(table).values(rows[i:i + UPSERT_BATCH_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(index_elements),
+            set_={column: stmt.excluded[column] for column in update_columns}
+        )
+        if returning:
+            stmt = stmt.returning(*(table.c[column] for column in returning))
+            result.extend(db.execute(stmt).all())
+        else:
+            db.execute(stmt)
+    return result
+
+def bulk_insert(db, model, rows: List[Dict[str, Any]]):
+    """Вставляет строки пачками многострочным INSERT"""
+    table = model.__table__
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        db.execute(plain_insert(table).values(rows[i:i + UPSERT_BATCH_SIZE]))
+
+def copy_rows(db, table_name: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]):
+    """
+    Загружает строки в таблицу командой COPY ... FROM STDIN (copy_expert psycopg2)
+    в текущей транзакции сессии. None передается как NULL
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([COPY_NULL if value is None else value for value in row])
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer
+        )
+    finally:
+        cursor.close()
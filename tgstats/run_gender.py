@@ -10,7 +10,8 @@ from transliterate import translit
 from tqdm import tqdm
 import pandas as pd
 
-from tgstats.database.database import Database
+from tgstats.database.database import Database, unit_of_work
+from tgstats.database.engine import dispose_engines
 from tgstats.config.config import Config
 from tgstats.database.models import ChannelParticipant
 
@@ -130,17 +131,16 @@ async def main():
 
     # Инициализация конфигурации и базы данных
     config = Config()
-    db = Database(config)
 
-    # Создание анализатора
-    analyzer = GenderAnalyzer(db)
-
-    try:
+    # Анализ выполняется в отдельной сессии на общем движке базы данных
+    with unit_of_work(config) as db:
+        analyzer = GenderAnalyzer(db)
         # Анализ пола для всех каналов
         analyzer.analyze_participants(config.CHANNEL_IDS)
-    finally:
-        # Закрытие соединения с базой данных
-        db.session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        # Пулы соединений закрываются только при завершении процесса
+        dispose_engines() 
\ No newline at end of file
@@ -10,6 +10,7 @@ from tgstats.run_gender import main as run_gender_analysis
 from tgstats.collect_comments import collect_comments
 from tgstats.logger import get_logger
 from tgstats.database.database import Database
+from tgstats.database.engine import dispose_engines
 
 logger = get_logger(__name__)
 
@@ -110,6 +111,9 @@ def main():
             logger.error(f"Ошибка в основном цикле планировщика: {str(e)}", exc_info=True)
             time.sleep(60)  # Пауза перед следующей попыткой
     
+    # Задачи выполняются в этом процессе и используют общий движок: пулы соединений
+    # закрываются только при остановке планировщика
+    dispose_engines()
     logger.info("Планировщик остановлен")
 
 if __name__ == "__main__":
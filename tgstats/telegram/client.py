@@ -1,17 +1,76 @@
 from telethon import TelegramClient as BaseTelegramClient
-from telethon.tl.types import Channel, User, InputPeerChannel
+from telethon import errors, utils
+from telethon.tl.types import Channel, User, InputPeerChannel, InputPeerUser, PeerChannel, PeerUser
 from typing import Union
+from tgstats.telegram.rate_limiter import RateLimiter
+from tgstats.config.config import RATE_LIMITS, FLOOD_MAX_RETRIES, FLOOD_MAX_WAIT
+
+def get_method_name(request) -> str:
+    """Имя метода API с учетом оберток InvokeWith*/InvokeWithout*"""
+    if utils.is_list_like(request):
+        request = request[0]
+    while type(request).__name__.startswith('Invoke') and hasattr(request, 'query'):
+        request = request.query
+    return type(request).__name__
 
 class TelegramClient(BaseTelegramClient):
+    def __init__(self, *args, rate_limiter=None, entity_cache=None, **kwargs):
+        # FloodWait обрабатывает ограничитель запросов, а не встроенный автосон Telethon
+        kwargs.setdefault('flood_sleep_threshold', 0)
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter or RateLimiter(
+            budgets=RATE_LIMITS,
+            max_retries=FLOOD_MAX_RETRIES,
+            max_wait=FLOOD_MAX_WAIT
+        )
+        self.entity_cache = entity_cache
+
+    async def _call(self, sender, request, ordered=False, flood_sleep_threshold=None):
+        """
+        Все запросы клиента (включая iter_messages и прочие высокоуровневые методы)
+        проходят через ограничитель: при FloodWait запрос повторяется после паузы, а не теряется
+        """
+        method = get_method_name(request)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(method)
+            try:
+                result = await super()._call(sender, request, ordered=ordered, flood_sleep_threshold=flood_sleep_threshold)
+            except (errors.FloodWaitError, errors.SlowModeWaitError) as e:
+                attempt += 1
+                if not self.rate_limiter.on_flood_wait(method, e.seconds, attempt):
+                    raise
+                continue
+            self.rate_limiter.on_success(method)
+            return result
+
     async def get_entity(self, peer: Union[int, str]) -> Union[Channel, User]:
         """
-        Переопределяем метод get_entity для работы с каналами
+        Переопределяем метод get_entity для работы с каналами.
+        Разрешенные сущности берутся из кэша (память и база данных), если он подключен
         """
+        if self.entity_cache is None:
+            return await self._fetch_entity(peer)
+        return await self.entity_cache.resolve(peer, self._fetch_entity, self._self_id or 0)
+
+    async def _fetch_entity(self, peer, access_hash=None):
+        """Запрашивает сущность у Telegram (access_hash передается из кэша, если известен)"""
+        if access_hash is not None and isinstance(peer, int):
+            real_id, peer_type = utils.resolve_id(peer)
+            if peer_type is PeerChannel:
+                return await super().get_entity(InputPeerChannel(real_id, access_hash))
+            if peer_type is PeerUser:
+                return await super().get_entity(InputPeerUser(real_id, access_hash))
+
         # Преобразуем в число если это строка
-        channel_id = int(peer) if isinstance(peer, str) else peer
+        channel_id = int(peer) if isinstance(peer, str) and peer.isdigit() else peer
         
-        # Создаем InputPeerChannel с правильным ID и access_hash=0
-        if channel_id > 0:
-            return await super().get_entity(InputPeerChannel(channel_id, 0))
+        if isinstance(channel_id, int) and channel_id > 0:
+            # Сначала ищем access_hash в сессии Telethon, иначе используем access_hash=0
+            try:
+                input_peer = await super().get_input_entity(PeerChannel(channel_id))
+            except ValueError:
+                input_peer = InputPeerChannel(channel_id, 0)
+            return await super().get_entity(input_peer)
             
-        return await super().get_entity(channel_id) 
\ No newline at end of file
+        return await super().get_entity(channel_id)
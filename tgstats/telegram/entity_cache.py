@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+from telethon import utils
+from telethon.extensions import BinaryReader
+from telethon.tl.types import Channel, Chat, User, PeerChannel
+from tgstats.database.models import TelegramEntity
+from tgstats.config.config import ENTITY_CACHE_TTL
+from tgstats.logger import get_logger
+
+logger = get_logger('telegram.entity_cache')
+
+def get_cache_key(peer):
+    """Ключ кэша: ID в формате Telethon (для каналов -100...) или 'username:<имя>'"""
+    if isinstance(peer, str):
+        if not peer.lstrip('-').isdigit():
+            return 'username:' + peer.lstrip('@').lower()
+        peer = int(peer)
+    if isinstance(peer, int):
+        # Положительные ID трактуются как ID каналов (как и в TelegramClient.get_entity)
+        return utils.get_peer_id(PeerChannel(peer)) if peer > 0 else peer
+    return utils.get_peer_id(peer)
+
+def get_entity_type(entity):
+    if isinstance(entity, Channel):
+        return 'channel'
+    if isinstance(entity, User):
+        return 'user'
+    if isinstance(entity, Chat):
+        return 'chat'
+    return None
+
+class EntityCache:
+    """
+    Кэш разрешенных сущностей Telegram.
+
+    Сущности хранятся в памяти процесса и в таблице telegram_entities вместе с access_hash,
+    поэтому повторное разрешение канала не требует запросов к Telegram. Одновременные
+    запросы одной и той же сущности объединяются в один запрос.
+    """
+
+    def __init__(self, db=None, ttl=timedelta(hours=ENTITY_CACHE_TTL)):
+        self.db = db
+        self.ttl = ttl
+        self._memory = {}
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, peer, fetch, account_id=0):
+        """
+        Возвращает сущность из кэша или получает ее через fetch(peer, access_hash).
+        access_hash передается, если сущность уже известна, но запись в базе устарела.
+        """
+        key = get_cache_key(peer)
+        entity = self._memory.get(key)
+        if entity is not None:
+            self.hits += 1
+            return entity
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, peer, fetch, account_id))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, key, peer, fetch, account_id):
+        row = self._get_row(key, account_id)
+        if row is not None and row.data and row.updated_at and datetime.utcnow() - row.updated_at < self.ttl:
+            try:
+                with BinaryReader(row.data) as reader:
+                    entity = reader.tgread_object()
+                self.hits += 1
+                self._remember_in_memory(entity, key)
+                return entity
+            except Exception as e:
+                logger.warning(f"Не удалось восстановить сущность {key} из кэша: {str(e)}")
+
+        self.misses += 1
+        if row is not None and row.access_hash is not None:
+            entity = await fetch(row.peer_id, row.access_hash)
+        else:
+            entity = await fetch(peer, None)
+        self.remember(entity, account_id, key)
+        return entity
+
+    def _get_row(self, key, account_id):
+        if self.db is None:
+            return None
+        try:
+            query = self.db.query(TelegramEntity).filter(TelegramEntity.account_id == account_id)
+            if isinstance(key, str):
+                return query.filter(TelegramEntity.username == key.split(':', 1)[1]).first()
+            return query.filter(TelegramEntity.peer_id == key).first()
+        except Exception as e:
+            logger.warning(f"Ошибка при чтении кэша сущностей: {str(e)}")
+            return None
+        finally:
+            # Завершаем транзакцию чтения: соединение возвращается в пул и не простаивает,
+            # пока сущность запрашивается у Telegram
+            self.db.close()
+
+    def _remember_in_memory(self, entity, key=None):
+        if key is not None:
+            self._memory[key] = entity
+        self._memory[utils.get_peer_id(entity)] = entity
+        username = getattr(entity, 'username', None)
+        if username:
+            self._memory['username:' + username.lower()] = entity
+
+    def remember(self, entity, account_id=0, key=None):
+        """Сохраняет сущность в памяти и в базе данных"""
+        entity_type = get_entity_type(entity)
+        if entity_type is None:
+            return
+        self._remember_in_memory(entity, key)
+        if self.db is None:
+            return
+
+        peer_id = utils.get_peer_id(entity)
+        username = entity.username.lower() if getattr(entity, 'username', None) else None
+        try:
+            row = self.db.query(TelegramEntity).filter(
+                TelegramEntity.account_id == account_id,
+                TelegramEntity.peer_id == peer_id
+            ).first()
+            if row is None:
+                row = TelegramEntity(account_id=account_id, peer_id=peer_id)
+                self.db.add(row)
+            row.entity_type = entity_type
+            row.access_hash = getattr(entity, 'access_hash', None)
+            row.username = username
+            row.data = bytes(entity)
+            row.updated_at = datetime.utcnow()
+            self.db.commit()
+        except Exception as e:
+            self.db.session.rollback()
+            logger.warning(f"Не удалось сохранить сущность {peer_id} в кэш: {str(e)}")
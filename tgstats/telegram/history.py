@@ -0,0 +1,141 @@
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+from telethon.tl.functions.messages import GetMessagesViewsRequest, GetMessagesReactionsRequest
+from telethon.tl.types import UpdateMessageReactions, ReactionEmoji, ReactionCustomEmoji, ReactionEmpty
+from tgstats.utils import convert_to_json_serializable
+
+# Сколько ID принимает messages.getMessagesViews за один запрос
+VIEWS_BATCH_SIZE = 100
+# Сколько ID запрашивать в одном messages.getMessagesReactions
+REACTIONS_BATCH_SIZE = 100
+
+
+def get_reaction_type(reaction) -> Optional[str]:
+    """
+    Стабильный ключ реакции: эмодзи, custom:<document_id> для кастомных эмодзи,
+    paid для платных реакций. Для пустой реакции возвращает None
+    """
+    if reaction is None or isinstance(reaction, ReactionEmpty):
+        return None
+    if isinstance(reaction, ReactionEmoji):
+        return reaction.emoticon
+    if isinstance(reaction, ReactionCustomEmoji):
+        return f"custom:{reaction.document_id}"
+    if reaction.__class__.__name__ == 'ReactionPaid':
+        return 'paid'
+    return reaction.__class__.__name__
+
+
+def get_reactions(message_reactions) -> List[Tuple[str, int]]:
+    """Пары (реакция, количество) из MessageReactions"""
+    if not message_reactions or not message_reactions.results:
+        return []
+    reactions = [
+        (get_reaction_type(reaction_count.reaction), reaction_count.count)
+        for reaction_count in message_reactions.results
+    ]
+    return [(reaction, count) for reaction, count in reactions if reaction is not None]
+
+
+class MessageRecord:
+    """
+    Компактная запись о сообщении канала без ссылок на объекты Telethon.
+    Запись с full=False содержит только счетчики (текст, медиа и raw не загружались)
+    """
+
+    __slots__ = ('id', 'date', 'text', 'views', 'forwards', 'replies', 'media_type', 'reactions', 'raw', 'full')
+
+    def __init__(self, id: int, date: datetime, text: Optional[str] = None, views: Optional[int] = None,
+                 forwards: Optional[int] = None, replies: int = 0, media_type: Optional[str] = None,
+                 reactions: Optional[List[Tuple[str, int]]] = None, raw: Optional[dict] = None,
+                 full: bool = True):
+        self.id = id
+        self.date = date
+        self.text = text
+        self.views = views
+        self.forwards = forwards
+        self.replies = replies
+        self.media_type = media_type
+        self.reactions = reactions or []
+        self.raw = raw
+        self.full = full
+
+    @classmethod
+    def from_message(cls, message, keep_raw: bool = False) -> 'MessageRecord':
+        """Создает запись из сообщения Telethon"""
+        return cls(
+            id=message.id,
+            date=message.date.replace(tzinfo=None),  # Убираем информацию о часовом поясе
+            text=message.text,
+            views=message.views,
+            forwards=message.forwards,
+            replies=message.replies.replies if message.replies else 0,
+            media_type=message.media.__class__.__name__ if message.media else None,
+            reactions=get_reactions(getattr(message, 'reactions', None)),
+            raw=convert_to_json_serializable(message) if keep_raw else None
+        )
+
+    @classmethod
+    def from_views(cls, id: int, date: datetime, views,
+                   reactions: Optional[List[Tuple[str, int]]] = None) -> 'MessageRecord':
+        """Создает запись только со счетчиками из результата messages.getMessagesViews"""
+        return cls(
+            id=id,
+            date=date,
+            views=views.views,
+            forwards=views.forwards,
+            replies=views.replies.replies if views.replies else 0,
+            reactions=reactions,
+            full=False
+        )
+
+    @property
+    def reactions_count(self) -> int:
+        return sum(count for _, count in self.reactions)
+
+
+async def iter_window(client, entity, since: datetime, until: Optional[datetime] = None,
+                      min_id: int = 0, keep_raw: bool = False) -> AsyncIterator[MessageRecord]:
+    """
+    Потоково обходит историю канала от новых сообщений к старым в окне [since, until).
+
+    Обход останавливается на первом сообщении старше since (или с ID не больше min_id),
+    поэтому число запросов зависит от размера окна, а не от возраста канала.
+    Даты since и until задаются в UTC без часового пояса.
+    """
+    async for message in client.iter_messages(entity, min_id=min_id, offset_date=until):
+        if not message.date:
+            continue
+        if message.date.replace(tzinfo=None) < since:
+            break
+        yield MessageRecord.from_message(message, keep_raw)
+
+
+async def iter_views(client, entity, ids: Sequence[int]) -> AsyncIterator[Tuple[int, object]]:
+    """
+    Счетчики просмотров, пересылок и ответов по ID сообщений: пары (ID, MessageViews).
+    Запросы идут пачками по VIEWS_BATCH_SIZE ID без увеличения счетчика просмотров;
+    удаленные сообщения (без просмотров) пропускаются
+    """
+    ids = list(ids)
+    for i in range(0, len(ids), VIEWS_BATCH_SIZE):
+        batch = ids[i:i + VIEWS_BATCH_SIZE]
+        result = await client(GetMessagesViewsRequest(peer=entity, id=batch, increment=False))
+        for message_id, views in zip(batch, result.views):
+            if views.views is None:
+                continue
+            yield message_id, views
+
+
+async def iter_reactions(client, entity, ids: Sequence[int]) -> AsyncIterator[Tuple[int, List[Tuple[str, int]]]]:
+    """
+    Текущие реакции сообщений: пары (ID, [(реакция, количество)]).
+    Запросы идут пачками по REACTIONS_BATCH_SIZE ID; сообщения, по которым
+    Telegram не прислал обновление, пропускаются
+    """
+    ids = list(ids)
+    for i in range(0, len(ids), REACTIONS_BATCH_SIZE):
+        result = await client(GetMessagesReactionsRequest(peer=entity, id=ids[i:i + REACTIONS_BATCH_SIZE]))
+        for update in getattr(result, 'updates', []):
+            if isinstance(update, UpdateMessageReactions):
+                yield update.msg_id, get_reactions(update.reactions)
@@ -0,0 +1,48 @@
+from tgstats.logger import get_logger
+
+logger = get_logger('telegram.pool')
+
+# Роли коллекторов: работа одной роли по одному каналу выполняется одним аккаунтом
+ROLES = ('history', 'participants', 'comments')
+
+class ClientPool:
+    """
+    Пул клиентов Telegram на разных аккаунтах.
+
+    У каждого клиента собственный ограничитель запросов, поэтому бюджеты и FloodWait
+    учитываются по каждому аккаунту отдельно. Работа распределяется по ролям
+    коллекторов и по каналам: например, обход участников канала идет через один
+    аккаунт, а чтение его истории - через другой.
+    """
+
+    def __init__(self, clients):
+        if not clients:
+            raise ValueError("Пул клиентов Telegram пуст")
+        self.clients = list(clients)
+
+    def __len__(self):
+        return len(self.clients)
+
+    def get(self, role='history', shard=0):
+        """Клиент для роли коллектора; shard - порядковый номер канала в прогоне"""
+        index = ROLES.index(role) if role in ROLES else 0
+        return self.clients[(index + shard) % len(self.clients)]
+
+    async def start(self):
+        for client in self.clients:
+            await client.start()
+        logger.info(f"Пул клиентов Telegram запущен: {len(self.clients)} аккаунтов")
+
+    async def disconnect(self):
+        for client in self.clients:
+            await client.disconnect()
+
+    def log_stats(self):
+        """Выводит статистику запросов и кэша сущностей по каждому аккаунту"""
+        for number, client in enumerate(self.clients, 1):
+            logger.info(f"Аккаунт {number}: статистика запросов к Telegram: {client.rate_limiter.stats()}")
+            if client.entity_cache is not None:
+                logger.info(
+                    f"Аккаунт {number}: кэш сущностей: {client.entity_cache.hits} попаданий, "
+                    f"{client.entity_cache.misses} промахов"
+                )
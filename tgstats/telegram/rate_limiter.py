@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+from tgstats.logger import get_logger
+
+logger = get_logger('telegram.rate_limiter')
+
+# Бюджеты по методам: (запросов в секунду, размер пачки)
+DEFAULT_BUDGETS = {
+    'GetHistoryRequest': (1.0, 5),
+    'GetRepliesRequest': (1.0, 5),
+    'GetMessagesRequest': (1.0, 5),
+    'GetMessagesViewsRequest': (1.0, 5),
+    'GetMessagesReactionsRequest': (1.0, 5),
+    'GetParticipantsRequest': (0.5, 3),
+    'GetParticipantRequest': (0.5, 3),
+    'GetFullChannelRequest': (0.2, 2),
+    'GetChannelsRequest': (0.5, 3),
+    'ResolveUsernameRequest': (0.1, 1),
+    'GetBroadcastStatsRequest': (0.1, 1),
+    'LoadAsyncGraphRequest': (0.5, 3),
+}
+# Бюджет для методов, не перечисленных явно
+DEFAULT_BUDGET = (2.0, 10)
+# Общий бюджет аккаунта на все методы
+GLOBAL_BUDGET = (20.0, 30)
+
+# Параметры адаптации: при FloodWait скорость метода уменьшается в DECREASE_FACTOR раз
+# (но не ниже MIN_RATE_FACTOR от бюджета), после каждого успешного запроса
+# восстанавливается на INCREASE_STEP от бюджета
+DECREASE_FACTOR = 0.5
+MIN_RATE_FACTOR = 0.1
+INCREASE_STEP = 0.05
+
+
+class TokenBucket:
+    """Токен-бакет с паузой на время FloodWait"""
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.min_rate = rate * MIN_RATE_FACTOR
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Забирает токен, дожидаясь его при необходимости. Возвращает время ожидания в секундах"""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def pause(self, seconds: float):
+        """Приостанавливает выдачу токенов и снижает скорость после FloodWait"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        self.updated = self.paused_until
+        self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+
+    def reward(self):
+        """Постепенно восстанавливает скорость после успешного запроса"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * INCREASE_STEP)
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов к Telegram с бюджетами по методам.
+
+    Перед каждым запросом забирается токен из общего бакета аккаунта и бакета метода.
+    FloodWait приостанавливает бакет метода на указанное сервером время и снижает
+    его скорость, после чего запрос повторяется; успешные запросы постепенно
+    возвращают скорость к бюджету.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, Tuple[float, int]]] = None,
+                 default_budget: Tuple[float, int] = DEFAULT_BUDGET,
+                 global_budget: Tuple[float, int] = GLOBAL_BUDGET,
+                 max_retries: int = 5, max_wait: int = 3600):
+        self.budgets = dict(DEFAULT_BUDGETS)
+        self.budgets.update(budgets or {})
+        self.default_budget = default_budget
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self._global = TokenBucket(*global_budget)
+        self._buckets = {}
+        self._counters = defaultdict(lambda: defaultdict(int))
+
+    def _bucket(self, method: str) -> TokenBucket:
+        if method not in self._buckets:
+            self._buckets[method] = TokenBucket(*self.budgets.get(method, self.default_budget))
+        return self._buckets[method]
+
+    async def acquire(self, method: str):
+        """Ожидает разрешения на запрос метода"""
+        waited = await self._global.acquire()
+        waited += await self._bucket(method).acquire()
+        counters = self._counters[method]
+        counters['requests'] += 1
+        counters['throttled_seconds'] += waited
+
+    def on_success(self, method: str):
+        self._bucket(method).reward()
+
+    def on_flood_wait(self, method: str, seconds: int, attempt: int) -> bool:
+        """
+        Учитывает FloodWait по методу. Возвращает True, если запрос нужно повторить
+        (бакет метода уже приостановлен на нужное время), и False, если повтор невозможен.
+        """
+        seconds = max(int(seconds), 1)
+        counters = self._counters[method]
+        counters['flood_waits'] += 1
+        counters['flood_wait_seconds'] += seconds
+
+        if attempt > self.max_retries or seconds > self.max_wait:
+            logger.error(f"FloodWait {seconds} с для {method}: повтор невозможен (попытка {attempt})")
+            return False
+
+        bucket = self._bucket(method)
+        bucket.pause(seconds)
+        counters['retries'] += 1
+        logger.warning(f"FloodWait {seconds} с для {method}, скорость снижена до {bucket.rate:.2f} запр/с, повтор {attempt}")
+        return True
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Счетчики запросов по методам"""
+        stats = {}
+        for method, counters in self._counters.items():
+            stats[method] = {name: round(value, 1) if isinstance(value, float) else value
+                             for name, value in counters.items()}
+            if method in self._buckets:
+                stats[method]['rate'] = round(self._buckets[method].rate, 3)
+        return stats
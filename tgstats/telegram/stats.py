@@ -0,0 +1,84 @@
+import json
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+from telethon import errors
+from telethon.tl.functions.stats import GetBroadcastStatsRequest, LoadAsyncGraphRequest
+from telethon.tl.types import StatsGraph, StatsGraphAsync, StatsAbsValueAndPrev
+from tgstats.logger import get_logger
+
+logger = get_logger('telegram.stats')
+
+# Графики stats.getBroadcastStats, которые сохраняются как временные ряды
+BROADCAST_GRAPHS = (
+    'growth_graph',
+    'followers_graph',
+    'mute_graph',
+    'top_hours_graph',
+    'interactions_graph',
+    'iv_interactions_graph',
+    'views_by_source_graph',
+    'new_followers_by_source_graph',
+    'languages_graph',
+    'reactions_by_emotion_graph',
+)
+# Значения оси X больше этого порога - время в миллисекундах
+TIMESTAMP_THRESHOLD = 10 ** 11
+
+
+async def invoke_stats(client, request):
+    """
+    Выполняет запрос статистики. Статистика крупных каналов живет в отдельном DC:
+    при StatsMigrateError запрос повторяется через соединение с этим DC
+    (с тем же ограничителем запросов и повторами после FloodWait)
+    """
+    try:
+        return await client(request)
+    except errors.StatsMigrateError as e:
+        sender = await client._borrow_exported_sender(e.dc)
+        try:
+            return await client._call(sender, request)
+        finally:
+            await client._return_exported_sender(sender)
+
+
+async def get_broadcast_stats(client, chat):
+    """Статистика канала и загруженные графики {имя: StatsGraph}"""
+    stats = await invoke_stats(client, GetBroadcastStatsRequest(channel=chat))
+    graphs = {}
+    for name in BROADCAST_GRAPHS:
+        graph = getattr(stats, name, None)
+        # Графики, которые не поместились в ответ, загружаются отдельно по токену
+        if isinstance(graph, StatsGraphAsync):
+            graph = await invoke_stats(client, LoadAsyncGraphRequest(token=graph.token))
+        if isinstance(graph, StatsGraph):
+            graphs[name] = graph
+        elif graph is not None:
+            logger.warning(f"График {name} недоступен: {getattr(graph, 'error', graph)}")
+    return stats, graphs
+
+
+def get_point_date(x: int) -> Optional[datetime]:
+    """Время точки (UTC без часового пояса), если ось X временная"""
+    return datetime.utcfromtimestamp(x / 1000) if x > TIMESTAMP_THRESHOLD else None
+
+
+def iter_graph_points(graph: StatsGraph) -> Iterator[Tuple[str, int, float]]:
+    """Точки графика: тройки (имя ряда, x, значение)"""
+    data = json.loads(graph.json.data)
+    names = data.get('names', {})
+    columns = {column[0]: column[1:] for column in data.get('columns', [])}
+    xs = columns.pop('x', [])
+    for key, values in columns.items():
+        series = names.get(key, key)
+        for x, value in zip(xs, values):
+            if value is not None:
+                yield series, int(x), float(value)
+
+
+def iter_summary_points(stats) -> Iterator[Tuple[str, float]]:
+    """Сводные показатели периода (текущее значение): пары (имя, значение)"""
+    for name, field in vars(stats).items():
+        if isinstance(field, StatsAbsValueAndPrev):
+            yield name, float(field.current)
+        elif name == 'enabled_notifications' and field is not None:
+            yield name, field.part / field.total * 100 if field.total else 0.0